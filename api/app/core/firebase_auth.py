@@ -1,6 +1,17 @@
+import os
 from fastapi import HTTPException, Header
 from app.core.firebase_init import logger, auth
+from app.core.firebase_tokens import TokenVerifier, claims_to_user
+from app.services.telemetry import stage
 
+# Verifies ID tokens locally, created on first use
+_verifier = None
+
+def get_token_verifier() -> TokenVerifier:
+    global _verifier
+    if _verifier is None:
+        _verifier = TokenVerifier(os.getenv("FIREBASE_PROJECT_ID"))
+    return _verifier
 
 
 def login_user(email: str, password: str):
@@ -22,8 +33,9 @@ def login_user(email: str, password: str):
 async def verify_token(authorization: str = Header(...)):
     try:
         token = authorization.split(" ")[1]
-        user_info = auth.get_account_info(token)
-        return user_info['users'][0]
+        with stage("verify_token"):
+            claims = await get_token_verifier().verify_async(token)
+        return claims_to_user(claims)
     except Exception as e:
         logger.error(f"Token verification failed: {str(e)}")
         raise HTTPException(status_code=401, detail="Invalid or expired token")
@@ -1,8 +1,6 @@
-import pyrebase
 import os
+import threading
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
 import logging
 
 # Configure logging
@@ -13,13 +11,12 @@ logger = logging.getLogger(__name__)
 env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env')
 logger.info(f"Loading environment variables from: {env_path}")
 
-if not os.path.exists(env_path):
-    logger.error(f"Environment file not found at: {env_path}")
-    raise FileNotFoundError(f"Environment file not found at: {env_path}")
+if os.path.exists(env_path):
+    load_dotenv(env_path)
+else:
+    logger.warning(f"Environment file not found at: {env_path}, using the process environment")
 
-load_dotenv(env_path)
-
-# Check required environment variables
+# Required environment variables, checked when the clients are created
 required_env_vars = [
     "FIREBASE_API_KEY",
     "FIREBASE_AUTH_DOMAIN",
@@ -30,47 +27,92 @@ required_env_vars = [
     "FIREBASE_DATABASE_URL"
 ]
 
-missing_vars = [var for var in required_env_vars if not os.getenv(var)]
-if missing_vars:
-    logger.error(f"Missing environment variables: {missing_vars}")
-    raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
-
-# Print loaded environment variables (excluding sensitive information)
-logger.info("Environment variables loaded successfully")
-logger.info(f"Project ID: {os.getenv('FIREBASE_PROJECT_ID')}")
-logger.info(f"Auth Domain: {os.getenv('FIREBASE_AUTH_DOMAIN')}")
-
-firebase_config = {
-    "apiKey": os.getenv("FIREBASE_API_KEY"),
-    "authDomain": os.getenv("FIREBASE_AUTH_DOMAIN"),
-    "projectId": os.getenv("FIREBASE_PROJECT_ID"),
-    "storageBucket": os.getenv("FIREBASE_STORAGE_BUCKET"),
-    "messagingSenderId": os.getenv("FIREBASE_MESSAGING_SENDER_ID"),
-    "appId": os.getenv("FIREBASE_APP_ID"),
-    "databaseURL": os.getenv("FIREBASE_DATABASE_URL"),
-}
-
-# Initialize Firestore connection
-try:
-    service_account_path = os.path.join(os.path.dirname(__file__), "keys", "serviceAccountKey.json")
-    if not os.path.exists(service_account_path):
-        raise FileNotFoundError(f"Service account key file not found at: {service_account_path}")
-    
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(service_account_path)
-        firebase_admin.initialize_app(cred)
-    db = firestore.client()
-    logger.info("Firestore initialized successfully")
-except Exception as e:
-    logger.error(f"Error initializing Firestore: {str(e)}")
-    raise
-
-# Initialize Firebase Auth
-try:
-    firebase = pyrebase.initialize_app(firebase_config)
-    auth = firebase.auth()
-    logger.info("Firebase Auth initialized successfully")
-except Exception as e:
-    logger.error(f"Error initializing Firebase Auth: {str(e)}")
-    raise
+service_account_path = os.path.join(os.path.dirname(__file__), "keys", "serviceAccountKey.json")
+
+# The Firebase SDKs are slow to import and connect, so the clients are
+# created on first use (or by init_firebase during application startup)
+_db = None
+_auth = None
+_init_lock = threading.Lock()
+
+
+def _check_env():
+    missing_vars = [var for var in required_env_vars if not os.getenv(var)]
+    if missing_vars:
+        logger.error(f"Missing environment variables: {missing_vars}")
+        raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
+
+
+def get_db():
+    """Firestore client, created on first call."""
+    global _db
+    if _db is None:
+        with _init_lock:
+            if _db is None:
+                try:
+                    _check_env()
+                    import firebase_admin
+                    from firebase_admin import credentials, firestore
+
+                    if not os.path.exists(service_account_path):
+                        raise FileNotFoundError(f"Service account key file not found at: {service_account_path}")
+
+                    if not firebase_admin._apps:
+                        cred = credentials.Certificate(service_account_path)
+                        firebase_admin.initialize_app(cred)
+                    _db = firestore.client()
+                    logger.info("Firestore initialized successfully")
+                except Exception as e:
+                    logger.error(f"Error initializing Firestore: {str(e)}")
+                    raise
+    return _db
+
+
+def get_auth():
+    """Pyrebase auth client, created on first call."""
+    global _auth
+    if _auth is None:
+        with _init_lock:
+            if _auth is None:
+                try:
+                    _check_env()
+                    import pyrebase
+
+                    firebase_config = {
+                        "apiKey": os.getenv("FIREBASE_API_KEY"),
+                        "authDomain": os.getenv("FIREBASE_AUTH_DOMAIN"),
+                        "projectId": os.getenv("FIREBASE_PROJECT_ID"),
+                        "storageBucket": os.getenv("FIREBASE_STORAGE_BUCKET"),
+                        "messagingSenderId": os.getenv("FIREBASE_MESSAGING_SENDER_ID"),
+                        "appId": os.getenv("FIREBASE_APP_ID"),
+                        "databaseURL": os.getenv("FIREBASE_DATABASE_URL"),
+                    }
+                    _auth = pyrebase.initialize_app(firebase_config).auth()
+                    logger.info("Firebase Auth initialized successfully")
+                except Exception as e:
+                    logger.error(f"Error initializing Firebase Auth: {str(e)}")
+                    raise
+    return _auth
+
+
+def init_firebase():
+    """Create both clients now (called in the background at application startup)."""
+    try:
+        get_db()
+        get_auth()
+    except Exception as e:
+        logger.error(f"Firebase warm-up failed, retrying on first use: {str(e)}")
+
+
+class _LazyClient:
+    """Module-level stand-in forwarding attribute access to the client built by `factory`."""
+
+    def __init__(self, factory):
+        self._factory = factory
+
+    def __getattr__(self, name):
+        return getattr(self._factory(), name)
+
 
+db = _LazyClient(get_db)
+auth = _LazyClient(get_auth)
@@ -1,6 +1,237 @@
+import asyncio
+import hashlib
+import json
+import numpy as np
+import pandas as pd
 from fastapi import HTTPException
 from app.core.firebase_init import db
+from app.services.telemetry import timed
 
+# Maximum number of documents requested in one batched read
+GET_ALL_CHUNK_SIZE = 100
+
+# Histories longer than this are stored in a "history" subcollection, in
+# chunks of this many points (~300 KB each), instead of in the portfolio doc
+HISTORY_CHUNK_POINTS = 50000
+
+# Version of the "portfolio_keys" documents that reserve each portfolio's configuration
+# and name for its owner; users whose "portfolio_keys_version" differs get theirs rebuilt
+PORTFOLIO_KEYS_VERSION = 2
+
+# Maximum number of writes in one batch
+BATCH_WRITE_LIMIT = 500
+
+def encode_history(dates: list, performance: list) -> tuple:
+	"""Pack a performance history into compact binary columns.
+
+	Dates become a start date plus uint16 day offsets, values become float32.
+
+	Returns:
+		tuple: (history dict for the portfolio document, list of chunk dicts
+		for the "history" subcollection, empty for short histories)
+	"""
+	days = pd.to_datetime(pd.Series(dates)).dt.normalize()
+	start = days.iloc[0] if len(days) else pd.Timestamp.today().normalize()
+	offsets = (days - start).dt.days.to_numpy()
+	if len(offsets) and (offsets.min() < 0 or offsets.max() > np.iinfo(np.uint16).max):
+		raise ValueError("Dates must be sorted and span less than 65536 days")
+	offsets = offsets.astype("<u2")
+	values = np.asarray(performance, dtype="<f4")
+
+	history = {"version": 1, "start": start.strftime("%Y-%m-%d"), "count": len(values), "chunks": 0}
+	if len(values) <= HISTORY_CHUNK_POINTS:
+		history |= {"offsets": offsets.tobytes(), "values": values.tobytes()}
+		return history, []
+
+	chunks = [
+		{"offsets": offsets[i:i + HISTORY_CHUNK_POINTS].tobytes(), "values": values[i:i + HISTORY_CHUNK_POINTS].tobytes()}
+		for i in range(0, len(values), HISTORY_CHUNK_POINTS)
+	]
+	history["chunks"] = len(chunks)
+	return history, chunks
+
+def decode_history(history: dict, chunks: list = None) -> tuple:
+	"""Inverse of encode_history.
+
+	Returns:
+		tuple: (list of "YYYY-MM-DD" dates, list of float performances)
+	"""
+	parts = chunks if history.get("chunks") else [history]
+	offsets = np.concatenate([np.frombuffer(p["offsets"], dtype="<u2") for p in parts]) if parts else np.array([], dtype="<u2")
+	values = np.concatenate([np.frombuffer(p["values"], dtype="<f4") for p in parts]) if parts else np.array([], dtype="<f4")
+	dates = (pd.Timestamp(history["start"]) + pd.to_timedelta(offsets.astype(np.int64), unit="D")).strftime("%Y-%m-%d")
+	return list(dates), np.round(values.astype(float), 8).tolist()
+
+def history_stats(performance: list, stats: dict = None) -> dict:
+	"""Summary statistics of a daily return series, updated incrementally.
+
+	Args:
+		performance (list): daily returns to add.
+		stats (dict): stats of the returns that came before, if any.
+
+	Returns:
+		dict: running sums plus cumulative_return, volatility (annualised) and max_drawdown.
+	"""
+	r = np.asarray(performance, dtype=float)
+	prev = stats or {"count": 0, "sum": 0.0, "sum_sq": 0.0, "wealth": 1.0, "peak": 1.0, "max_drawdown": 0.0}
+
+	wealth_path = prev["wealth"] * np.cumprod(1 + r)
+	peak_path = np.maximum.accumulate(np.concatenate([[prev["peak"]], wealth_path]))[1:]
+	drawdowns = 1 - wealth_path / peak_path if len(r) else np.array([0.0])
+
+	count = prev["count"] + len(r)
+	total = prev["sum"] + float(r.sum())
+	total_sq = prev["sum_sq"] + float((r ** 2).sum())
+	wealth = float(wealth_path[-1]) if len(r) else prev["wealth"]
+	variance = (total_sq - total ** 2 / count) / (count - 1) if count > 1 else 0.0
+
+	return {
+		"count": count,
+		"sum": total,
+		"sum_sq": total_sq,
+		"wealth": wealth,
+		"peak": float(peak_path[-1]) if len(r) else prev["peak"],
+		"max_drawdown": max(prev["max_drawdown"], float(drawdowns.max())),
+		"cumulative_return": wealth - 1,
+		"volatility": float(np.sqrt(max(variance, 0.0) * 252)),
+	}
+
+def append_history(history: dict, tail: dict, dates: list, performance: list) -> tuple:
+	"""Append points to an encoded history without decoding all of it.
+
+	Args:
+		history (dict): the encoded history of the portfolio document.
+		tail (dict): the last chunk document, when the history is chunked.
+		dates (list): new dates, after the last stored one.
+		performance (list): new daily performances.
+
+	Returns:
+		tuple: (updated history dict, {chunk index: chunk dict} to write)
+	"""
+	start = pd.Timestamp(history["start"])
+	days = (pd.to_datetime(pd.Series(dates)).dt.normalize() - start).dt.days.to_numpy()
+	if len(days) and days.max() > np.iinfo(np.uint16).max:
+		raise ValueError("History spans more than 65536 days")
+	history = dict(history)
+	first = history["chunks"] - 1 if history["chunks"] else 0
+	part = tail if history["chunks"] else history
+	offsets = np.concatenate([np.frombuffer(part["offsets"], dtype="<u2"), days.astype("<u2")])
+	values = np.concatenate([np.frombuffer(part["values"], dtype="<f4"), np.asarray(performance, dtype="<f4")])
+	history["count"] += len(days)
+
+	if not history["chunks"] and len(values) <= HISTORY_CHUNK_POINTS:
+		history |= {"offsets": offsets.tobytes(), "values": values.tobytes()}
+		return history, {}
+
+	# Chunked: rewrite the last chunk and add new ones as needed
+	history.pop("offsets", None)
+	history.pop("values", None)
+	chunks = {}
+	for i in range(0, len(values), HISTORY_CHUNK_POINTS):
+		chunks[first + i // HISTORY_CHUNK_POINTS] = {
+			"offsets": offsets[i:i + HISTORY_CHUNK_POINTS].tobytes(),
+			"values": values[i:i + HISTORY_CHUNK_POINTS].tobytes(),
+		}
+	history["chunks"] = first + len(chunks)
+	return history, chunks
+
+def name_key(name: str) -> str:
+	"""Portfolio name as compared for duplicates: case and extra whitespace are ignored."""
+	return " ".join(str(name).split()).casefold()
+
+def config_hash(tickers: list, weights: list, first_date: str) -> str:
+	"""Canonical hash of a portfolio configuration, for duplicate detection.
+
+	Tickers are sorted together with their weights. Every portfolio runs from its
+	first date to its latest refresh, so the first date stands for the dates and
+	the hash does not change when a refresh appends to the history.
+	"""
+	assets = sorted(zip(tickers, (float(w) for w in weights)))
+	key = json.dumps([assets, first_date], separators=(",", ":"))
+	return hashlib.sha256(key.encode()).hexdigest()
+
+def portfolio_keys(uid: str, tickers: list, weights: list, dates: list, name: str) -> list:
+	"""IDs of the "portfolio_keys" documents reserving this configuration and this name for `uid`."""
+	first_date = pd.Timestamp(dates[0]).strftime("%Y-%m-%d") if len(dates) else None
+	name_hash = hashlib.sha256(name_key(name).encode()).hexdigest()
+	return [f"{uid}_config_{config_hash(tickers, weights, first_date)}", f"{uid}_name_{name_hash}"]
+
+def _with_decoded_history(ptf_ref, ptf_data: dict) -> dict:
+	"""Replace the encoded history of a portfolio document by plain `dates`/`performance` lists.
+
+	Documents written before the compact encoding already have the lists and are returned as is.
+	"""
+	history = ptf_data.pop("history", None)
+	if history is None:
+		if "stats" not in ptf_data and ptf_data.get("performance"):
+			ptf_data["stats"] = history_stats(ptf_data["performance"])
+		return ptf_data
+	chunks = []
+	if history.get("chunks"):
+		chunk_docs = sorted(ptf_ref.collection("history").stream(), key=lambda doc: int(doc.id))
+		chunks = [doc.to_dict() for doc in chunk_docs]
+	ptf_data["dates"], ptf_data["performance"] = decode_history(history, chunks)
+	return ptf_data
+
+def get_documents_firebase(collection: str, doc_ids: list):
+	"""Read many documents of a collection with batched `get_all` calls.
+
+	Args:
+		collection (str): The collection name.
+		doc_ids (list): The document IDs to read.
+
+	Returns:
+		dict: document ID -> data, for the documents that exist.
+	"""
+	col = db.collection(collection)
+	docs = {}
+	for i in range(0, len(doc_ids), GET_ALL_CHUNK_SIZE):
+		refs = [col.document(doc_id) for doc_id in doc_ids[i:i + GET_ALL_CHUNK_SIZE]]
+		for doc in db.get_all(refs):
+			if doc.exists:
+				docs[doc.id] = doc.to_dict()
+	return docs
+
+def _get_owned_portfolios(uid: str):
+	"""Portfolio documents whose "uid" field is `uid`, as {ptfid: data}."""
+	from google.cloud.firestore_v1 import FieldFilter
+
+	query = db.collection("portfolios").where(filter=FieldFilter("uid", "==", uid))
+	return {doc.id: doc.to_dict() for doc in query.stream()}
+
+def _index_portfolio_keys(uid: str):
+	"""Write the "portfolio_keys" documents of every portfolio of `uid` (for portfolios created before they existed).
+
+	If older portfolios already duplicate each other, the first one gets the key.
+	"""
+	user_ref = db.collection("users").document(uid)
+	keys_col = db.collection("portfolio_keys")
+	writes, taken = [], set()
+	for ptf_id, data in _get_owned_portfolios(uid).items():
+		ptf_ref = db.collection("portfolios").document(ptf_id)
+		ptf = _with_decoded_history(ptf_ref, data)
+		keys = portfolio_keys(uid, ptf["tickers"], ptf["weights"], ptf.get("dates", []), ptf.get("name", ""))
+		keys = [key for key in keys if key not in taken]
+		taken.update(keys)
+		writes.append(("update", ptf_ref, {"keys": keys}))
+		writes += [("set", keys_col.document(key), {"uid": uid, "ptfid": ptf_id}) for key in keys]
+	writes.append(("update", user_ref, {"portfolio_keys_version": PORTFOLIO_KEYS_VERSION}))
+
+	for i in range(0, len(writes), BATCH_WRITE_LIMIT):
+		batch = db.batch()
+		for op, ref, fields in writes[i:i + BATCH_WRITE_LIMIT]:
+			getattr(batch, op)(ref, fields)
+		batch.commit()
+
+async def _ensure_portfolio_keys(uid: str):
+	"""Raise a 404 if the user does not exist; build the keys of their older portfolios once."""
+	user_doc = await asyncio.to_thread(db.collection("users").document(uid).get)
+	if not user_doc.exists:
+		raise HTTPException(status_code=404, detail="User not found")
+	if user_doc.to_dict().get("portfolio_keys_version") != PORTFOLIO_KEYS_VERSION:
+		await asyncio.to_thread(_index_portfolio_keys, uid)
+
+@timed("firestore")
 async def create_new_portfolio_firebase(uid: str, ptfid:str, tickers: list, weights: list, dates: list, performance: list, portfolio_name: str = "New Portfolio"):
 	"""Create a new portfolio in Firebase Firestore.
 
@@ -12,46 +243,57 @@ async def create_new_portfolio_firebase(uid: str, ptfid:str, tickers: list, weig
 		dates (list): list of the dates for the portfolio
 		performance (list): list of the daily performance for the portfolio
 	"""
-	# Before, we check if the portfolio does not already exist
-	# Get the user portfolios
-	user_ptfs = await get_user_portfolios_firebase(uid)
-	if user_ptfs:
-		for ptf in user_ptfs:
-			if portfolio_name == ptf["name"]:
-				raise HTTPException(status_code=400, detail="Portfolio with this name already exists")
-			if tickers == ptf["tickers"] and weights == ptf["weights"] and dates == ptf["dates"]:
-				raise HTTPException(status_code=400, detail="Portfolio with this configuration already exists")
+	from google.api_core.exceptions import Conflict, NotFound
+	from google.cloud.firestore_v1 import ArrayUnion
+
+	history, chunks = await asyncio.to_thread(encode_history, dates, performance)
+	dates, performance = await asyncio.to_thread(decode_history, history, chunks)
+
+	await _ensure_portfolio_keys(uid)
+	keys = portfolio_keys(uid, tickers, weights, dates, portfolio_name)
+
 	# Create a new portfolio document
 	portfolio_data = {
 		"uid": uid,
 		"ptfid": ptfid,
 		"tickers": tickers,
 		"weights": weights,
-		"dates": dates,
-		"performance": performance,
 		"name": portfolio_name
 	}
-	# Save to 'portfolios' collection
-	db.collection("portfolios").document(ptfid).set(portfolio_data)
 
-	# Link portfolio to the user
+	# In one atomic batch: save to 'portfolios' collection (long histories chunked into a
+	# subcollection), reserve its configuration and name, and link the portfolio to the user.
+	# The batch fails if a key is already taken (duplicate) or if the user does not exist.
+	ptf_ref = db.collection("portfolios").document(ptfid)
 	user_ref = db.collection("users").document(uid)
-	user_doc = user_ref.get()
-
-	if not user_doc.exists:
+	key_refs = [db.collection("portfolio_keys").document(key) for key in keys]
+	batch = db.batch()
+	batch.set(ptf_ref, portfolio_data | {"keys": keys, "history": history, "stats": history_stats(performance)})
+	for i, chunk in enumerate(chunks):
+		batch.set(ptf_ref.collection("history").document(str(i)), chunk)
+	for key_ref in key_refs:
+		batch.create(key_ref, {"uid": uid, "ptfid": ptfid})
+	batch.update(user_ref, {"portfolios": ArrayUnion([ptfid])})
+	try:
+		await asyncio.to_thread(batch.commit)
+	except NotFound:
 		raise HTTPException(status_code=404, detail="User not found")
+	except Conflict:
+		name_doc = await asyncio.to_thread(key_refs[1].get)
+		taken = "name" if name_doc.exists else "configuration"
+		raise HTTPException(status_code=409, detail=f"Portfolio with this {taken} already exists")
 
-	user_data = user_doc.to_dict()
-	existing_portfolios = user_data.get("portfolios", [])
-	existing_portfolios.append(ptfid)
-	user_ref.update({"portfolios": existing_portfolios})
-
+	portfolio_data |= {"dates": dates, "performance": performance, "stats": history_stats(performance)}
 	return portfolio_data
 
+@timed("firestore")
 async def get_user_portfolios_firebase(uid: str):
-	# Get user document
+	# Read the user document and the user's portfolios at the same time
 	user_ref = db.collection("users").document(uid)
-	user_doc = user_ref.get()
+	user_doc, ptf_docs = await asyncio.gather(
+		asyncio.to_thread(user_ref.get),
+		asyncio.to_thread(_get_owned_portfolios, uid),
+	)
 
 	if not user_doc.exists:
 		raise HTTPException(status_code=404, detail="User not found")
@@ -59,17 +301,23 @@ async def get_user_portfolios_firebase(uid: str):
 	user_data = user_doc.to_dict()
 	portfolio_ids = user_data.get("portfolios", [])
 
-	# Fetch each portfolio by ID
-	portfolios = []
-	for ptf_id in portfolio_ids:
-		ptf_doc = db.collection("portfolios").document(ptf_id).get()
-		if ptf_doc.exists:
-			ptf_data = ptf_doc.to_dict()
-			ptf_data["portfolio_id"] = ptf_id
-			portfolios.append(ptf_data)
+	# Listed portfolios the query did not return (e.g. no "uid" field) are read by ID
+	unlisted = [ptf_id for ptf_id in portfolio_ids if ptf_id not in ptf_docs]
+	if unlisted:
+		ptf_docs |= await asyncio.to_thread(get_documents_firebase, "portfolios", unlisted)
+
+	# Decode histories concurrently, keeping the user's order
+	ptf_ids = [ptf_id for ptf_id in portfolio_ids if ptf_id in ptf_docs]
+	portfolios = await asyncio.gather(*(
+		asyncio.to_thread(_with_decoded_history, db.collection("portfolios").document(ptf_id), ptf_docs[ptf_id])
+		for ptf_id in ptf_ids
+	))
+	for ptf_id, ptf_data in zip(ptf_ids, portfolios):
+		ptf_data["portfolio_id"] = ptf_id
 
-	return portfolios
+	return list(portfolios)
 
+@timed("firestore")
 async def get_portfolio_firebase(ptfid: str):
 	"""Get a portfolio from Firebase Firestore.
 
@@ -80,36 +328,137 @@ async def get_portfolio_firebase(ptfid: str):
 		dict: The portfolio data.
 	"""
 	ptf_ref = db.collection("portfolios").document(ptfid)
-	ptf_doc = ptf_ref.get()
+	ptf_doc = await asyncio.to_thread(ptf_ref.get)
 
 	if not ptf_doc.exists:
 		raise HTTPException(status_code=404, detail="Portfolio not found")
 
-	return ptf_doc.to_dict()
+	return await asyncio.to_thread(_with_decoded_history, ptf_ref, ptf_doc.to_dict())
+
+def _owned_portfolio(ptf_doc, uid: str) -> dict:
+	"""Data of a portfolio document, or a 404/403 if it does not exist or is not owned by `uid`."""
+	if not ptf_doc.exists:
+		raise HTTPException(status_code=404, detail="Portfolio not found")
+	ptf_data = ptf_doc.to_dict()
+	if ptf_data.get("uid") != uid:
+		raise HTTPException(status_code=403, detail="Not allowed to modify this portfolio")
+	return ptf_data
+
+def _last_date(history: dict, tail: dict = None):
+	"""Last stored date of an encoded history ("YYYY-MM-DD"), or None if it is empty."""
+	if not history["count"]:
+		return None
+	part = tail if history["chunks"] else history
+	last_offset = int(np.frombuffer(part["offsets"], dtype="<u2")[-1])
+	return (pd.Timestamp(history["start"]) + pd.Timedelta(days=last_offset)).strftime("%Y-%m-%d")
+
+@timed("firestore")
+async def get_portfolio_last_date_firebase(uid: str, ptfid: str):
+	"""Get a portfolio's tickers, weights and last stored date, without decoding its history.
 
+	Args:
+		uid (str): The caller's unique identifier, who must own the portfolio.
+		ptfid (str): The portfolio's unique identifier.
+
+	Returns:
+		dict: {"tickers", "weights", "last_date" ("YYYY-MM-DD" or None)}
+	"""
+	ptf_ref = db.collection("portfolios").document(ptfid)
+	ptf_data = _owned_portfolio(await asyncio.to_thread(ptf_ref.get), uid)
+
+	history = ptf_data.get("history")
+	if history is None:
+		raise HTTPException(status_code=400, detail="Portfolio uses the legacy history format and cannot be refreshed")
+	tail = None
+	if history["count"] and history["chunks"]:
+		tail_doc = await asyncio.to_thread(ptf_ref.collection("history").document(str(history["chunks"] - 1)).get)
+		tail = tail_doc.to_dict()
+	return {"tickers": ptf_data["tickers"], "weights": ptf_data["weights"], "last_date": _last_date(history, tail)}
+
+@timed("firestore")
+async def append_portfolio_performance_firebase(uid: str, ptfid: str, dates: list, performance: list):
+	"""Append new daily performances to a stored portfolio and update its summary stats.
+
+	The last stored date is read, and the points after it appended, in one
+	transaction: points on or before the stored last date (already appended by
+	a concurrent refresh) are dropped. Only the portfolio document (and, for
+	long histories, its last chunk) is read and rewritten.
+
+	Args:
+		uid (str): The caller's unique identifier, who must own the portfolio.
+		ptfid (str): The portfolio's unique identifier.
+		dates (list): new dates ("YYYY-MM-DD"), after the last stored one.
+		performance (list): new daily performances.
+
+	Returns:
+		dict: {"added": number of points appended, "stats": the updated stats}
+	"""
+	from google.cloud.firestore_v1 import transactional
+
+	ptf_ref = db.collection("portfolios").document(ptfid)
+
+	@transactional
+	def append(transaction):
+		ptf_data = _owned_portfolio(ptf_ref.get(transaction=transaction), uid)
+		history = ptf_data.get("history")
+		if history is None:
+			raise HTTPException(status_code=400, detail="Portfolio uses the legacy history format and cannot be refreshed")
+
+		tail = None
+		if history["chunks"]:
+			tail_ref = ptf_ref.collection("history").document(str(history["chunks"] - 1))
+			tail = tail_ref.get(transaction=transaction).to_dict()
+		last_date = _last_date(history, tail)
+		new = [(d, p) for d, p in zip(dates, performance) if last_date is None or pd.Timestamp(d).strftime("%Y-%m-%d") > last_date]
+		if not new:
+			return {"added": 0, "stats": ptf_data.get("stats")}
+		new_dates, new_performance = [d for d, _ in new], [p for _, p in new]
+
+		if not history["count"]:
+			history = dict(history, start=pd.Timestamp(new_dates[0]).strftime("%Y-%m-%d"))
+		history, chunks = append_history(history, tail, new_dates, new_performance)
+		stats = history_stats(new_performance, ptf_data.get("stats"))
+		transaction.update(ptf_ref, {"history": history, "stats": stats})
+		for i, chunk in chunks.items():
+			transaction.set(ptf_ref.collection("history").document(str(i)), chunk)
+		return {"added": len(new_dates), "stats": stats}
+
+	return await asyncio.to_thread(append, db.transaction())
+
+@timed("firestore")
 async def delete_portfolio_firebase(uid: str, ptfid: str):
 	"""Delete a portfolio from Firebase Firestore.
 
+	The portfolio document, its history chunks, its duplicate-detection keys and
+	its entry in the user's list are removed in one transaction.
+
 	Args:
 		uid (str): The user's unique identifier.
 		ptfid (str): The portfolio's unique identifier.
 	"""
-	# Get the user document
-	user_ref = db.collection("users").document(uid)
-	user_doc = user_ref.get()
-
-	if not user_doc.exists:
-		raise HTTPException(status_code=404, detail="User not found")
+	from google.cloud.firestore_v1 import ArrayRemove, transactional
 
-	user_data = user_doc.to_dict()
-	existing_portfolios = user_data.get("portfolios", [])
+	user_ref = db.collection("users").document(uid)
+	ptf_ref = db.collection("portfolios").document(ptfid)
 
-	if ptfid not in existing_portfolios:
-		raise HTTPException(status_code=404, detail="Portfolio not found")
+	@transactional
+	def delete(transaction):
+		# Both documents are read in one call
+		docs = {doc.reference.path: doc for doc in db.get_all([user_ref, ptf_ref], transaction=transaction)}
+		user_doc, ptf_doc = docs.get(user_ref.path), docs.get(ptf_ref.path)
+		if user_doc is None or not user_doc.exists:
+			raise HTTPException(status_code=404, detail="User not found")
+		if ptfid not in user_doc.to_dict().get("portfolios", []):
+			raise HTTPException(status_code=404, detail="Portfolio not found")
 
-	# Delete the portfolio document
-	db.collection("portfolios").document(ptfid).delete()
+		# The chunk count is read in the transaction, so a concurrent refresh cannot leave orphans
+		ptf_data = ptf_doc.to_dict() if ptf_doc is not None and ptf_doc.exists else {}
+		history = ptf_data.get("history") or {}
+		for i in range(history.get("chunks", 0)):
+			transaction.delete(ptf_ref.collection("history").document(str(i)))
+		for key in ptf_data.get("keys", []):
+			transaction.delete(db.collection("portfolio_keys").document(key))
+		transaction.delete(ptf_ref)
+		transaction.update(user_ref, {"portfolios": ArrayRemove([ptfid])})
 
-	# Remove the portfolio ID from the user's list of portfolios
-	existing_portfolios.remove(ptfid)
-	user_ref.update({"portfolios": existing_portfolios})
+	await asyncio.to_thread(delete, db.transaction())
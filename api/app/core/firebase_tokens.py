@@ -0,0 +1,198 @@
+import asyncio
+import re
+import threading
+import time
+
+import jwt
+import requests
+from cachetools import TTLCache
+from cryptography.x509 import load_pem_x509_certificate
+
+from app.core.firebase_init import logger
+from app.services.telemetry import count
+
+# Public certificates used to sign Firebase ID tokens
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+# Refresh the signing keys this many seconds before they expire
+KEY_REFRESH_MARGIN = 300
+
+# Fallback key lifetime when the response has no usable Cache-Control header
+DEFAULT_KEY_MAX_AGE = 3600
+
+# Minimum seconds between reloads triggered by an unknown key id
+MIN_RELOAD_INTERVAL = 60
+
+# Seconds to wait before fetching again after a failed fetch
+RETRY_INTERVAL = 30
+
+# Decoded claims are reused for at most this many seconds
+CLAIMS_TTL = 60
+
+
+def fetch_google_certs(url: str = FIREBASE_CERTS_URL):
+	"""Download the signing certificates.
+
+	Returns:
+		tuple: ({kid: PEM certificate}, max_age in seconds from Cache-Control)
+	"""
+	response = requests.get(url, timeout=10)
+	response.raise_for_status()
+	match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+	max_age = int(match.group(1)) if match else DEFAULT_KEY_MAX_AGE
+	return response.json(), max_age
+
+
+class SigningKeys:
+	"""Cached public keys, refreshed in the background as they near expiry.
+
+	The last good key set keeps being served while a refresh is pending or
+	failing; a request only waits for a fetch when no key matches its `kid`
+	(cold start or a freshly rotated key), and `get_async` runs that fetch in
+	a thread. `loader` returns ({kid: PEM certificate}, max_age); tests can
+	pass one that serves a local stand-in key set.
+	"""
+
+	def __init__(self, loader=fetch_google_certs):
+		self._loader = loader
+		self._keys = {}
+		self._expires_at = 0.0
+		self._loaded_at = 0.0
+		self._retry_at = 0.0
+		self._generation = 0
+		self._lock = threading.Lock()
+		self._fetch_lock = threading.Lock()
+		self._refreshing = False
+
+	def _refresh(self):
+		"""Fetch the key set. On failure the current keys are kept, further
+		fetches wait RETRY_INTERVAL, and the error is raised."""
+		generation = self._generation
+		with self._fetch_lock:
+			if self._generation != generation:
+				return  # Another thread refreshed while this one waited
+			try:
+				certs, max_age = self._loader()
+				keys = {kid: load_pem_x509_certificate(pem.encode()).public_key() for kid, pem in certs.items()}
+			except Exception:
+				self._retry_at = time.time() + RETRY_INTERVAL
+				raise
+			with self._lock:
+				self._keys = keys
+				self._loaded_at = time.time()
+				self._expires_at = self._loaded_at + max_age
+				self._generation += 1
+		logger.info(f"Loaded {len(keys)} token signing keys, valid for {max_age}s")
+
+	def _refresh_in_background(self):
+		with self._lock:
+			if self._refreshing:
+				return
+			self._refreshing = True
+
+		def run():
+			try:
+				self._refresh()
+			except Exception as e:
+				logger.error(f"Background refresh of signing keys failed, serving the previous keys: {str(e)}")
+			finally:
+				self._refreshing = False
+
+		threading.Thread(target=run, name="signing-keys-refresh", daemon=True).start()
+
+	def _lookup(self, kid: str):
+		"""Key for `kid` from the current set (possibly past its max-age), starting a
+		background refresh when the set nears expiry. Never blocks."""
+		now = time.time()
+		if self._keys and now >= self._expires_at - KEY_REFRESH_MARGIN and now >= self._retry_at:
+			self._refresh_in_background()
+		return self._keys.get(kid)
+
+	def _must_fetch(self) -> bool:
+		"""Whether an unknown `kid` justifies waiting for a fetch now."""
+		now = time.time()
+		if now < self._retry_at:
+			return False
+		# Cold start, or possibly a freshly rotated key
+		return not self._keys or now - self._loaded_at >= MIN_RELOAD_INTERVAL
+
+	def get(self, kid: str):
+		"""Return the public key for `kid`, fetching keys in this thread only when unavoidable."""
+		key = self._lookup(kid)
+		if key is None and self._must_fetch():
+			self._refresh()
+			key = self._keys.get(kid)
+		if key is None:
+			raise jwt.InvalidTokenError(f"Unknown signing key: {kid}")
+		return key
+
+	async def get_async(self, kid: str):
+		"""Same as `get`, but an unavoidable fetch runs in a thread, off the event loop."""
+		key = self._lookup(kid)
+		if key is None and self._must_fetch():
+			await asyncio.to_thread(self._refresh)
+			key = self._keys.get(kid)
+		if key is None:
+			raise jwt.InvalidTokenError(f"Unknown signing key: {kid}")
+		return key
+
+
+class TokenVerifier:
+	"""Verify Firebase ID tokens locally (signature, audience, issuer, expiry)."""
+
+	def __init__(self, project_id: str, keys: SigningKeys = None, claims_ttl: int = CLAIMS_TTL, max_cached: int = 10000):
+		self.project_id = project_id
+		self.keys = keys or SigningKeys()
+		self._claims = TTLCache(maxsize=max_cached, ttl=claims_ttl)
+		self._claims_lock = threading.Lock()
+
+	def _cached(self, token: str):
+		with self._claims_lock:
+			claims = self._claims.get(token)
+		if claims is not None and claims["exp"] > time.time():
+			count("cache_lookups_total", cache="token_claims", result="hit")
+			return claims
+		count("cache_lookups_total", cache="token_claims", result="miss")
+		return None
+
+	def _decode(self, token: str, key) -> dict:
+		claims = jwt.decode(
+			token,
+			key,
+			algorithms=["RS256"],
+			audience=self.project_id,
+			issuer=f"https://securetoken.google.com/{self.project_id}",
+			options={"require": ["exp", "iat", "sub"]},
+		)
+		if not claims["sub"]:
+			raise jwt.InvalidTokenError("Token has an empty subject")
+
+		with self._claims_lock:
+			self._claims[token] = claims
+		return claims
+
+	def verify(self, token: str) -> dict:
+		"""Return the decoded claims of a valid token, or raise jwt.InvalidTokenError."""
+		claims = self._cached(token)
+		if claims is not None:
+			return claims
+		kid = jwt.get_unverified_header(token).get("kid")
+		return self._decode(token, self.keys.get(kid))
+
+	async def verify_async(self, token: str) -> dict:
+		"""Same as `verify`, without blocking the event loop on a key fetch."""
+		claims = self._cached(token)
+		if claims is not None:
+			return claims
+		kid = jwt.get_unverified_header(token).get("kid")
+		return self._decode(token, await self.keys.get_async(kid))
+
+
+def claims_to_user(claims: dict) -> dict:
+	"""Shape decoded claims like the user record returned by get_account_info."""
+	return {
+		"localId": claims["sub"],
+		"email": claims.get("email"),
+		"emailVerified": claims.get("email_verified", False),
+		"claims": claims,
+	}
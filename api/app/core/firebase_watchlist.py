@@ -1,5 +1,11 @@
+import asyncio
+import os
+import threading
+import time
 from fastapi import HTTPException
-from app.core.firebase_init import db
+from app.core.firebase_init import db, logger
+from app.core.firebase_portfolio import get_documents_firebase
+from app.services.telemetry import timed
 
 
 DEFAULT_WATCHLIST = [
@@ -7,17 +13,104 @@ DEFAULT_WATCHLIST = [
     "TSLA", "NVDA", "JPM", "JNJ", "XOM"
 ]
 
+# Seconds before the in-memory Stocks index is refreshed from Firestore
+STOCKS_INDEX_TTL = int(os.getenv("STOCKS_INDEX_TTL", "600"))
+
+# Seconds to wait before loading the Stocks index again after a failed load
+STOCKS_INDEX_RETRY = int(os.getenv("STOCKS_INDEX_RETRY", "60"))
+
+
+class StocksIndex:
+	"""Process-wide copy of the Stocks collection, keyed by ticker.
+
+	Loaded on first use; once older than STOCKS_INDEX_TTL it keeps serving the
+	current copy while a single background thread reloads it. After a failed
+	load, no new load starts for `retry` seconds.
+	"""
+
+	def __init__(self, ttl: int = STOCKS_INDEX_TTL, retry: int = STOCKS_INDEX_RETRY):
+		self.ttl = ttl
+		self.retry = retry
+		self._by_ticker = {}
+		self._stocks = []
+		self._loaded_at = None
+		self._retry_at = 0.0
+		self._lock = threading.Lock()
+		self._refreshing = False
+
+	def _load(self):
+		try:
+			by_ticker = {doc.id: doc.to_dict() | {"ticker": doc.id} for doc in db.collection("Stocks").stream()}
+		except Exception:
+			self._retry_at = time.time() + self.retry
+			raise
+		self._by_ticker, self._stocks = by_ticker, list(by_ticker.values())
+		self._loaded_at = time.time()
+		logger.info(f"Stocks index loaded ({len(by_ticker)} tickers)")
+
+	def _refresh_in_background(self):
+		with self._lock:
+			if self._refreshing or time.time() < self._retry_at:
+				return
+			self._refreshing = True
+
+		def run():
+			try:
+				self._load()
+			except Exception as e:
+				logger.error(f"Stocks index refresh failed: {str(e)}")
+			finally:
+				with self._lock:
+					self._refreshing = False
+
+		threading.Thread(target=run, name="stocks-index-refresh", daemon=True).start()
+
+	def _ensure_fresh(self):
+		if self._loaded_at is None:
+			with self._lock:
+				if self._loaded_at is None:
+					if time.time() < self._retry_at:
+						raise RuntimeError("Stocks index unavailable, try again later")
+					self._load()
+		elif time.time() - self._loaded_at > self.ttl:
+			self._refresh_in_background()
+
+	async def ensure_loaded(self):
+		"""Load the index off the event loop if it has never been loaded."""
+		if self._loaded_at is None:
+			await asyncio.to_thread(self._ensure_fresh)
+
+	def all(self) -> list:
+		self._ensure_fresh()
+		return self._stocks
+
+	def get(self, ticker: str):
+		self._ensure_fresh()
+		return self._by_ticker.get(ticker)
+
+	def __contains__(self, ticker: str) -> bool:
+		self._ensure_fresh()
+		return ticker in self._by_ticker
+
+
+stocks_index = StocksIndex()
+
 async def get_all_stocks_firebase():
-	"""Get all stocks from Firebase Firestore.
+	"""Get all stocks from the in-memory Stocks index.
 
 	Returns:
 		list: A list of dictionaries containing stock data.
 		format of the dictionary is the same as the one in the Firestore collection.
 	"""
-	stocks = db.collection("Stocks").stream()
-	stock_list = [doc.to_dict() | {"ticker": doc.id} for doc in stocks]
-	return stock_list
+	await stocks_index.ensure_loaded()
+	return stocks_index.all()
+
+async def get_invalid_tickers(tickers: list):
+	"""Return the tickers that are not in the Stocks collection (no Firestore read)."""
+	await stocks_index.ensure_loaded()
+	return [ticker for ticker in tickers if ticker not in stocks_index]
 
+@timed("firestore")
 async def get_user_watchlist_firebase(uid:str):
 	"""Get the user's watchlist from Firebase Firestore.
 	Fetches the user's watchlist from Firestore. If the watchlist does not exist, it initializes it with a default list of stocks.
@@ -30,20 +123,24 @@ async def get_user_watchlist_firebase(uid:str):
 		list: A list of dictionaries containing stock data in the user's watchlist.
 	"""
 	user_ref = db.collection("users").document(uid)
-	user_doc = user_ref.get()
+	user_doc, _ = await asyncio.gather(asyncio.to_thread(user_ref.get), stocks_index.ensure_loaded())
 
 	if not user_doc.exists or "watchlist" not in user_doc.to_dict():
-		user_ref.set({"watchlist": DEFAULT_WATCHLIST}, merge=True)
+		await asyncio.to_thread(user_ref.set, {"watchlist": DEFAULT_WATCHLIST}, merge=True)
 		watchlist = DEFAULT_WATCHLIST
 	else:
 		watchlist = user_doc.to_dict().get("watchlist", [])
 
-	stocks_collection = db.collection("Stocks")
-	stock_docs = [stocks_collection.document(t).get() for t in watchlist]
-	stock_data = [doc.to_dict() | {"ticker": doc.id} for doc in stock_docs if doc.exists]
+	# Serve stock data from the index, reading only unknown tickers (in one batch)
+	stocks = {t: stocks_index.get(t) for t in watchlist}
+	missing = [t for t, stock in stocks.items() if stock is None]
+	if missing:
+		stocks |= await asyncio.to_thread(get_documents_firebase, "Stocks", missing)
+	stock_data = [stocks[t] | {"ticker": t} for t in watchlist if stocks.get(t) is not None]
 
 	return stock_data
 
+@timed("firestore")
 async def add_to_watchlist_firebase(ticker: str, uid: str):
 	"""Add a stock to the user's watchlist in Firebase Firestore.
 	this checks to make sure the stock is in the database before adding it to the watchlist.
@@ -56,23 +153,23 @@ async def add_to_watchlist_firebase(ticker: str, uid: str):
 		list: The updated watchlist after adding the stock.
 	"""
 	user_ref = db.collection("users").document(uid)
-	user_doc = user_ref.get()
+	user_doc, _ = await asyncio.gather(asyncio.to_thread(user_ref.get), stocks_index.ensure_loaded())
 	watchlist = user_doc.to_dict().get("watchlist", []) if user_doc.exists else []
 
 	# Check if the ticker exists in the Stocks collection
-	stocks = await get_all_stocks_firebase()
-	if ticker not in [stock["ticker"] for stock in stocks]:
+	if ticker not in stocks_index:
 		raise HTTPException(status_code=400, detail=f"{ticker} is not a valid stock ticker. It was not found in the database.")
 
 	# If the ticker is not already in the watchlist, add it
 	if ticker not in watchlist:
 		watchlist.append(ticker)
-		user_ref.update({"watchlist": watchlist})
+		await asyncio.to_thread(user_ref.update, {"watchlist": watchlist})
 	else:
 		raise HTTPException(status_code=400, detail=f"{ticker} is already in the watchlist.")
 
 	return watchlist
 
+@timed("firestore")
 async def remove_from_watchlist_firebase(ticker: str, uid: str):
 	"""Remove a stock from the user's watchlist in Firebase Firestore.
 
@@ -85,7 +182,7 @@ async def remove_from_watchlist_firebase(ticker: str, uid: str):
 	"""
 	# Fetch the user's watchlist
 	user_ref = db.collection("users").document(uid)
-	user_doc = user_ref.get()
+	user_doc = await asyncio.to_thread(user_ref.get)
 
 	# Check if the user document exists and get the watchlist
 	if not user_doc.exists:
@@ -96,7 +193,7 @@ async def remove_from_watchlist_firebase(ticker: str, uid: str):
 
 	if ticker in watchlist:
 		watchlist.remove(ticker)
-		user_ref.update({"watchlist": watchlist})
+		await asyncio.to_thread(user_ref.update, {"watchlist": watchlist})
 	else:
 		raise HTTPException(status_code=400, detail=f"{ticker} is not in the watchlist.")
 
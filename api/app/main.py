@@ -1,10 +1,29 @@
-from fastapi import FastAPI
+import threading
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from app.core.firebase_init import init_firebase
 from app.routes import user
 from app.routes import portfolio
+from app.services.optimize_jobs import shutdown_pool
+from app.services.telemetry import install_log_context, observe, render_metrics, set_request_id
 
+# Log lines carry the id of the request they belong to
+install_log_context()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connect to Firebase in the background so startup is not delayed
+    threading.Thread(target=init_firebase, name="firebase-init", daemon=True).start()
+    yield
+    # Stop the optimisation worker processes
+    shutdown_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -15,6 +34,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """Tag the request with an id (X-Request-ID, generated if absent) and time it."""
+    request_id = set_request_id(request.headers.get("X-Request-ID"))
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        route = request.scope.get("route")
+        observe(
+            "http_request_seconds",
+            time.perf_counter() - start,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=status,
+        )
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 # Include user routes
 app.include_router(user.router)
 app.include_router(portfolio.router)
@@ -22,3 +62,8 @@ app.include_router(portfolio.router)
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Intelligent Portfolio API"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,155 @@
+"""backtest.py – Walk-forward evaluation
+======================================
+Re-optimises weights on a rolling or expanding lookback window at each
+rebalance date and chains the out-of-sample returns into one equity curve.
+No I/O, no charts.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from app.optimizitation.metrics import RunningMoments, compute_portfolio_series, optimise_weights
+
+__all__ = [
+    "rebalance_blocks",
+    "fit_block",
+    "walk_forward",
+]
+
+_logger = logging.getLogger(__name__)
+
+# ─────────────────────────────────────────────────────────────────────
+#  HELPERS
+# ─────────────────────────────────────────────────────────────────────
+
+def _window_start(t: int, lookback: int, expanding: bool) -> int:
+    return 0 if expanding else t - lookback
+
+# ─────────────────────────────────────────────────────────────────────
+#  PUBLIC API
+# ─────────────────────────────────────────────────────────────────────
+
+def rebalance_blocks(n_periods: int, lookback: int, rebalance_every: int, n_blocks: int = 1) -> list[list[int]]:
+    """Rebalance indices of a walk-forward over *n_periods* returns, split into at
+    most *n_blocks* contiguous blocks.
+
+    Each block can be fitted independently (``fit_block``), e.g. in separate
+    worker processes; concatenated in order, the results are ``walk_forward``'s
+    *fitted* argument.
+    """
+    if lookback < 2 or rebalance_every < 1:
+        raise ValueError("lookback must be >= 2 and rebalance_every >= 1")
+    rebalance_at = list(range(lookback, n_periods, rebalance_every))
+    if not rebalance_at:
+        raise ValueError("Not enough data for a single out-of-sample period")
+    n_blocks = max(1, min(n_blocks, len(rebalance_at)))
+    return [[int(t) for t in block] for block in np.array_split(rebalance_at, n_blocks)]
+
+
+def fit_block(
+    returns: pd.DataFrame,
+    rebalance_at: list[int],
+    *,
+    metric: str = "sharpe",
+    lookback: int = 252,
+    expanding: bool = False,
+    allow_short: bool = False,
+    max_long: float = 1.0,
+    max_short: float = 1.0,
+) -> list[np.ndarray | None]:
+    """Fit weights at consecutive rebalance indices, updating moments incrementally.
+
+    Moments are built from scratch for the first index of the block only;
+    afterwards the window just gains (and, if rolling, loses) the rows
+    between two rebalance dates. Failed solves yield None.
+    """
+    bounds = {"allow_short": allow_short, "max_long": max_long, "max_short": max_short}
+    values = returns.to_numpy(dtype=float)
+    running = RunningMoments(returns.columns)
+    lo = hi = _window_start(rebalance_at[0], lookback, expanding)
+    weights = []
+    for t in rebalance_at:
+        start = _window_start(t, lookback, expanding)
+        if start >= hi:
+            # No overlap with the previous window
+            running = RunningMoments(returns.columns)
+            lo = hi = start
+        running.add(values[hi:t])
+        if start > lo:
+            running.remove(values[lo:start])
+        lo, hi = start, t
+        try:
+            weights.append(optimise_weights(
+                returns.iloc[lo:hi], metric, moments=running.moments(), **bounds))
+        except Exception as exc:
+            _logger.warning("Rebalance at %s failed: %s", returns.index[t], exc)
+            weights.append(None)
+    return weights
+
+
+def walk_forward(
+    returns: pd.DataFrame,
+    metric: str = "sharpe",
+    *,
+    lookback: int = 252,
+    rebalance_every: int = 21,
+    expanding: bool = False,
+    allow_short: bool = False,
+    max_long: float = 1.0,
+    max_short: float = 1.0,
+    fitted: list | None = None,
+) -> dict:
+    """Walk-forward backtest of ``optimise_weights``.
+
+    Parameters
+    ----------
+    returns : DataFrame
+        Return matrix (index = dates, columns = assets).
+    metric, allow_short, max_long, max_short
+        As in ``optimise_weights``.
+    lookback : int
+        Number of periods in the fitting window (its minimum size if expanding).
+    rebalance_every : int
+        Number of periods each set of weights is held out of sample.
+    expanding : bool
+        If True, fit on all data up to each rebalance date instead of a
+        rolling window of *lookback* periods.
+    fitted : list, optional
+        Weights already fitted for every rebalance date, in order (the
+        ``fit_block`` results of all ``rebalance_blocks``, concatenated);
+        fitted here in one pass if omitted.
+
+    Returns
+    -------
+    dict
+        'weights': DataFrame of weights per rebalance date,
+        'returns': out-of-sample portfolio return Series,
+        'cum_returns': cumulative percentage Series (``compute_portfolio_series``).
+        A failed rebalance keeps the previous weights (equal weights at first).
+    """
+    T, n = returns.shape
+    (rebalance_at,) = rebalance_blocks(T, lookback, rebalance_every)
+    if fitted is None:
+        fitted = fit_block(
+            returns, rebalance_at, metric=metric, lookback=lookback, expanding=expanding,
+            allow_short=allow_short, max_long=max_long, max_short=max_short,
+        )
+    elif len(fitted) != len(rebalance_at):
+        raise ValueError(f"Expected weights for {len(rebalance_at)} rebalance dates, got {len(fitted)}")
+
+    rows, last = [], np.full(n, 1 / n)
+    for w in fitted:
+        last = w if w is not None else last
+        rows.append(last)
+    weights = pd.DataFrame(rows, index=returns.index[rebalance_at], columns=returns.columns)
+
+    # Hold each set of weights until the next rebalance date
+    oos = returns.iloc[lookback:]
+    held = weights.reindex(oos.index).ffill()
+    return {
+        "weights": weights,
+        "returns": (oos * held).sum(axis=1),
+        "cum_returns": compute_portfolio_series(oos, held),
+    }
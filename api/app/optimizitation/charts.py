@@ -4,17 +4,45 @@ All user‑facing figures are built here so that visual logic is separated from
 numerical logic.
 """
 
+from typing import TYPE_CHECKING
+
 import plotly.express as px
 import pandas as pd
 
-__all__ = ["cumulative_return_chart"]
+from app.optimizitation.metrics import downsample_series
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+__all__ = ["cumulative_return_chart", "figure_json"]
+
+# Above this many points: WebGL trace, no markers.
+LARGE_SERIES_POINTS = 2000
+
+# Series longer than this are decimated (LTTB) before plotting.
+MAX_PLOT_POINTS = 10000
 
 
-def cumulative_return_chart(cum_pct: pd.Series, title: str) -> "plotly.graph_objs.Figure":
-    """Generate an interactive Plotly line chart from a cumulative‑percent Series."""
+def cumulative_return_chart(
+    cum_pct: pd.Series,
+    title: str,
+    *,
+    large_threshold: int = LARGE_SERIES_POINTS,
+    max_points: int | None = MAX_PLOT_POINTS,
+) -> "go.Figure":
+    """Generate an interactive Plotly line chart from a cumulative‑percent Series.
+
+    Large series (more than *large_threshold* points) are drawn with a WebGL
+    trace and without markers; series longer than *max_points* are first
+    decimated with a shape‑preserving downsampler.
+    """
     if cum_pct.name is None:
         cum_pct = cum_pct.rename("Cumulative Return (%)")
 
+    large = len(cum_pct) > large_threshold
+    if max_points and len(cum_pct) > max_points:
+        cum_pct = downsample_series(cum_pct, max_points)
+
     df = cum_pct.to_frame().reset_index()
     df.columns = ["Date", "Cumulative Return (%)"]
 
@@ -23,8 +51,17 @@ def cumulative_return_chart(cum_pct: pd.Series, title: str) -> "plotly.graph_obj
         x="Date",
         y="Cumulative Return (%)",
         title=title,
-        markers=True,
+        markers=not large,
+        render_mode="webgl" if large else "auto",
         template="plotly_white",
     )
     fig.update_yaxes(tickformat=".2f")
     return fig
+
+
+def figure_json(fig: "go.Figure") -> str:
+    """Compact figure JSON (data + layout) for ``Plotly.newPlot`` on the frontend.
+
+    Much smaller than an HTML export, which embeds plotly.js itself.
+    """
+    return fig.to_json(pretty=False, remove_uids=True)
@@ -3,20 +3,6 @@ import logging
 import webbrowser
 from pathlib import Path
 
-import pandas as pd
-
-from app.services.yfinance_service import fetch_prices
-from metrics import (
-    calculate_returns,
-    optimise_weights,
-    compute_portfolio_series,
-    sharpe_ratio,
-    sortino_ratio,
-    total_return,
-    periodic_avg_return,
-)
-from charts import cumulative_return_chart
-
 # ----------------------------------------------------------------------------
 #  CLI
 # ----------------------------------------------------------------------------
@@ -28,11 +14,16 @@ def _build_parser() -> argparse.ArgumentParser:
     p.add_argument("--end", help="End date (default: today)")
     p.add_argument("--interval", default="1d", help="Yahoo interval, e.g. 1m, 5m, 1d…")
     p.add_argument("--metric", default="sharpe", help="Optimisation metric")
-    p.add_argument("--outfile", default="portfolio.html", help="HTML output path")
+    p.add_argument("--cov-method", default="sample", choices=["sample", "ledoit_wolf", "factor"],
+                   help="Covariance estimator (ledoit_wolf / factor for large universes)")
+    p.add_argument("--outfile", default="portfolio.html", help="Output path (.html, or .json for figure JSON)")
+    p.add_argument("--inline-js", action="store_true", help="Embed plotly.js in the HTML instead of loading it from a CDN")
     return p
 
 
 def _evaluate_metric(metric: str, weights, returns) -> float:
+    from metrics import sharpe_ratio, sortino_ratio, total_return, periodic_avg_return
+
     m = metric.lower()
     if m == "sharpe":
         return sharpe_ratio(weights, returns)
@@ -53,6 +44,12 @@ def main():
 
     logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
 
+    # Imported after argument parsing: pandas, scipy, yfinance and plotly
+    # take seconds to load, and this CLI never touches Firebase.
+    from app.services.yfinance_service import fetch_prices
+    from metrics import calculate_returns, optimise_weights, compute_portfolio_series
+    from charts import cumulative_return_chart, figure_json
+
     # 1) Fetch price data -----------------------------------------------------
     prices = fetch_prices(
         tickers=args.tickers,
@@ -63,7 +60,7 @@ def main():
 
     # 2) Compute returns & optimise weights ----------------------------------
     returns = calculate_returns(prices, args.interval)
-    weights = optimise_weights(returns, args.metric)
+    weights = optimise_weights(returns, args.metric, cov_method=args.cov_method)
     weights_dict = {c: round(w, 4) for c, w in zip(returns.columns, weights)}
 
     # 3) Build portfolio performance series ----------------------------------
@@ -75,7 +72,10 @@ def main():
     # 5) Create figure & export ----------------------------------------------
     fig = cumulative_return_chart(cum_pct, f"Optimised Portfolio – {args.metric.capitalize()}")
     out = Path(args.outfile).resolve()
-    fig.write_html(out, include_plotlyjs="inline")
+    if out.suffix.lower() == ".json":
+        out.write_text(figure_json(fig))
+    else:
+        fig.write_html(out, include_plotlyjs="inline" if args.inline_js else "cdn")
 
     # 6) Report ---------------------------------------------------------------
     print("Optimised weights:")
@@ -85,6 +85,8 @@ def main():
     print(f"Figure saved to {out}")
 
     # auto‑open
+    if out.suffix.lower() == ".json":
+        return
     try:
         webbrowser.open(out.as_uri())
     except Exception as exc:  # pragma: no cover – safety
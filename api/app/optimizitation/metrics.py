@@ -5,11 +5,13 @@ and weight optimisation.
 No I/O, no charts.
 """
 
+from functools import cached_property
+
 import numpy as np
 import pandas as pd
-from scipy.optimize import minimize
 
 from app.services.yfinance_service import RESAMPLE_RULE 
+from app.services.telemetry import observe
 
 __all__ = [
     "calculate_returns",
@@ -17,8 +19,20 @@ __all__ = [
     "sortino_ratio",
     "total_return",
     "periodic_avg_return",
+    "METRICS",
+    "COV_METHODS",
+    "ledoit_wolf_cov",
+    "factor_cov",
+    "LowRankCov",
+    "Moments",
+    "RunningMoments",
+    "portfolio_metrics",
     "optimise_weights",
+    "efficient_frontier",
+    "random_weights",
+    "random_portfolios",
     "compute_portfolio_series",
+    "downsample_series",
 ]
 
 # ─────────────────────────────────────────────────────────────────────
@@ -43,21 +57,27 @@ def calculate_returns(prices: pd.DataFrame, interval: str) -> pd.DataFrame:
 #  METRICS
 # ─────────────────────────────────────────────────────────────────────
 
+# Metric names accepted by optimise_weights and random_portfolios (lower case)
+METRICS = ("sharpe", "sortino", "total return", "weekly return", "daily return")
+
 def _annualise(mu: float, ppy: int) -> float:
     """Linear annualisation (simple returns)."""
     return mu * ppy
 
 
+# w'·cov(R)·w is the sample variance of R·w, so the ratios below never build
+# the n × n covariance matrix (O(T·n) instead of O(T·n²)).
+
 def sharpe_ratio(weights: np.ndarray, returns: pd.DataFrame, rf: float = 0.0, ppy: int = 252) -> float:
     mu = np.dot(weights, returns.mean())
-    sigma = np.sqrt(np.dot(weights.T, returns.cov() @ weights))
+    sigma = np.std(returns.to_numpy(dtype=float) @ weights, ddof=1)
     return (_annualise(mu, ppy) - rf) / (sigma * np.sqrt(ppy))
 
 
 def sortino_ratio(weights: np.ndarray, returns: pd.DataFrame, rf: float = 0.0, ppy: int = 252) -> float:
     mu = np.dot(weights, returns.mean())
-    downside = returns.clip(upper=0)
-    sigma_d = np.sqrt(np.dot(weights.T, downside.cov() @ weights))
+    downside = np.minimum(returns.to_numpy(dtype=float), 0.0)
+    sigma_d = np.std(downside @ weights, ddof=1)
     return (_annualise(mu, ppy) - rf) / (sigma_d * np.sqrt(ppy))
 
 
@@ -70,10 +90,374 @@ def periodic_avg_return(weights: np.ndarray, returns: pd.DataFrame, period: str
     freq = {"weekly": 52, "daily": 252}[period]
     return np.dot(weights, returns.mean()) * freq
 
+# ─────────────────────────────────────────────────────────────────────
+#  COVARIANCE ESTIMATORS
+# ─────────────────────────────────────────────────────────────────────
+
+# "sample": np.cov; "ledoit_wolf": shrinkage towards a scaled identity;
+# "factor": statistical (PCA) factor model, kept in low-rank form
+COV_METHODS = ("sample", "ledoit_wolf", "factor")
+
+# Number of factors of the "factor" estimator
+DEFAULT_N_FACTORS = 10
+
+
+def ledoit_wolf_cov(values: np.ndarray) -> np.ndarray:
+    """Ledoit-Wolf shrinkage of the sample covariance of *values* (T × n).
+
+    Returns (1 - s)·S + s·(tr(S)/n)·I with the intensity s of Ledoit & Wolf
+    (2004), which keeps the estimate well conditioned when n approaches T.
+    """
+    T, n = values.shape
+    X = values - values.mean(axis=0)
+    S = X.T @ X / T
+    mu = np.trace(S) / n
+    X2 = X**2
+    # Squared distance of S to the target, and the estimation error of S
+    delta = ((S - mu * np.eye(n)) ** 2).sum() / n
+    beta = ((X2.T @ X2).sum() / T - (S**2).sum()) / (n * T)
+    shrinkage = 0.0 if delta == 0 else min(beta, delta) / delta
+
+    # Same shrinkage applied to the unbiased estimate, as used everywhere else
+    sample = S * T / (T - 1)
+    return (1 - shrinkage) * sample + shrinkage * (mu * T / (T - 1)) * np.eye(n)
+
+
+class LowRankCov:
+    """Covariance B·Bᵀ + diag(d) kept in factored form (B is n × k).
+
+    ``cov @ w`` and ``W @ cov`` cost O(n·k) per vector instead of O(n²);
+    the n × n matrix is only built by ``to_dense``.
+    """
+
+    __array_ufunc__ = None  # ndarray @ LowRankCov defers to __rmatmul__
+
+    def __init__(self, loadings: np.ndarray, specific: np.ndarray):
+        self.loadings = loadings
+        self.specific = specific
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return (len(self.specific), len(self.specific))
+
+    def __matmul__(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=float)
+        d = self.specific if x.ndim == 1 else self.specific[:, None]
+        return self.loadings @ (self.loadings.T @ x) + d * x
+
+    def __rmatmul__(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=float)
+        return (x @ self.loadings) @ self.loadings.T + x * self.specific
+
+    def to_dense(self) -> np.ndarray:
+        return self.loadings @ self.loadings.T + np.diag(self.specific)
+
+
+def factor_cov(values: np.ndarray, n_factors: int = DEFAULT_N_FACTORS) -> LowRankCov:
+    """Statistical factor model of the covariance of *values* (T × n).
+
+    The loadings are the top *n_factors* principal components (from a thin
+    SVD of the centred returns); the diagonal holds each asset's remaining
+    (specific) variance, so the diagonal matches the sample variances.
+    """
+    T = len(values)
+    X = values - values.mean(axis=0)
+    _, sv, vt = np.linalg.svd(X, full_matrices=False)
+    k = max(1, min(n_factors, len(sv) - 1))
+    loadings = vt[:k].T * (sv[:k] / np.sqrt(T - 1))
+    variance = (X**2).sum(axis=0) / (T - 1)
+    floor = np.finfo(float).eps * max(variance.max(), np.finfo(float).tiny)
+    specific = np.maximum(variance - (loadings**2).sum(axis=1), floor)
+    return LowRankCov(loadings, specific)
+
+
+def _estimate_cov(values: np.ndarray, method: str, n_factors: int):
+    if method == "sample":
+        return np.atleast_2d(np.cov(values, rowvar=False))
+    if method == "ledoit_wolf":
+        return ledoit_wolf_cov(values)
+    if method == "factor":
+        return factor_cov(values, n_factors)
+    raise ValueError(f"Unsupported covariance method '{method}'")
+
+# ─────────────────────────────────────────────────────────────────────
+#  MOMENTS
+# ─────────────────────────────────────────────────────────────────────
+
+# Memory budget of the per-chunk matrices in random_portfolios
+RANDOM_CHUNK_BYTES = 64 * 1024 * 1024
+# Largest number of portfolios random_portfolios will sample
+MAX_RANDOM_PORTFOLIOS = 1_000_000
+
+class Moments:
+    """Per-asset return moments, computed once (lazily) from a return matrix.
+
+    Values match the pandas-based metric functions above: ``mean`` is
+    ``returns.mean()``, ``cov`` is ``returns.cov()``, ``downside_cov`` is
+    ``returns.clip(upper=0).cov()`` and ``cum`` is the per-asset total return.
+
+    With *cov_method* "ledoit_wolf" or "factor" (see COV_METHODS), ``cov``
+    and ``downside_cov`` come from that estimator instead; "factor" gives
+    ``LowRankCov`` objects, which support ``@`` like an ndarray.
+    """
+
+    def __init__(self, returns: pd.DataFrame, cov_method: str = "sample", n_factors: int = DEFAULT_N_FACTORS):
+        if cov_method not in COV_METHODS:
+            raise ValueError(f"Unsupported covariance method '{cov_method}'")
+        self.columns = returns.columns
+        self.values = returns.to_numpy(dtype=float)
+        self.cov_method = cov_method
+        self.n_factors = n_factors
+
+    @classmethod
+    def from_stats(cls, columns: pd.Index, **stats: np.ndarray) -> "Moments":
+        """Build from already computed moments (keyword names as the properties)."""
+        moments = cls.__new__(cls)
+        moments.columns = columns
+        moments.values = None
+        moments.cov_method = "sample"
+        moments.__dict__.update(stats)
+        return moments
+
+    @property
+    def n_assets(self) -> int:
+        return len(self.columns)
+
+    @cached_property
+    def mean(self) -> np.ndarray:
+        return self.values.mean(axis=0)
+
+    @cached_property
+    def cov(self) -> np.ndarray | LowRankCov:
+        return _estimate_cov(self.values, self.cov_method, self.n_factors)
+
+    @cached_property
+    def downside_cov(self) -> np.ndarray | LowRankCov:
+        return _estimate_cov(np.minimum(self.values, 0.0), self.cov_method, self.n_factors)
+
+    @cached_property
+    def cum(self) -> np.ndarray:
+        return np.prod(1 + self.values, axis=0) - 1
+
+
+class RunningMoments:
+    """Sufficient statistics of a moving window of returns.
+
+    Rows are added to / removed from the window in O(rows · n²), so a rolling
+    or expanding window never recomputes its moments from scratch.
+    """
+
+    def __init__(self, columns: pd.Index):
+        n = len(columns)
+        self.columns = columns
+        self.count = 0
+        self._sum = np.zeros(n)
+        self._outer = np.zeros((n, n))
+        self._down_sum = np.zeros(n)
+        self._down_outer = np.zeros((n, n))
+        self._log_growth = np.zeros(n)
+
+    def _update(self, rows: np.ndarray, sign: int) -> None:
+        rows = np.atleast_2d(rows)
+        down = np.minimum(rows, 0.0)
+        self.count += sign * len(rows)
+        self._sum += sign * rows.sum(axis=0)
+        self._outer += sign * (rows.T @ rows)
+        self._down_sum += sign * down.sum(axis=0)
+        self._down_outer += sign * (down.T @ down)
+        self._log_growth += sign * np.log1p(rows).sum(axis=0)
+
+    def add(self, rows: np.ndarray) -> None:
+        self._update(rows, 1)
+
+    def remove(self, rows: np.ndarray) -> None:
+        self._update(rows, -1)
+
+    def moments(self) -> Moments:
+        """Moments of the current window (same definitions as ``Moments``)."""
+        if self.count < 2:
+            raise ValueError("At least two returns are needed")
+        n = self.count
+        mean = self._sum / n
+        down_mean = self._down_sum / n
+        return Moments.from_stats(
+            self.columns,
+            mean=mean,
+            cov=(self._outer - n * np.outer(mean, mean)) / (n - 1),
+            downside_cov=(self._down_outer - n * np.outer(down_mean, down_mean)) / (n - 1),
+            cum=np.expm1(self._log_growth),
+        )
+
+
+def portfolio_metrics(weights: np.ndarray, moments: Moments, rf: float = 0.0, ppy: int = 252) -> dict[str, np.ndarray]:
+    """Metrics of many portfolios at once, one per row of *weights*.
+
+    Each metric is a product of the (k, n) weight matrix with precomputed
+    moments, so k portfolios cost a few BLAS calls instead of k DataFrame
+    passes. Values match the single-portfolio functions above.
+
+    Returns
+    -------
+    dict
+        Arrays of length k: "return" and "volatility" (annualised),
+        "sharpe", "sortino", "total return", "weekly return", "daily return".
+    """
+    W = np.atleast_2d(weights)
+    mu = W @ moments.mean
+    sigma = np.sqrt(np.maximum(np.einsum("ij,ij->i", W @ moments.cov, W), 0.0))
+    sigma_d = np.sqrt(np.maximum(np.einsum("ij,ij->i", W @ moments.downside_cov, W), 0.0))
+    excess = _annualise(mu, ppy) - rf
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = excess / (sigma * np.sqrt(ppy))
+        sortino = excess / (sigma_d * np.sqrt(ppy))
+    return {
+        "return": _annualise(mu, ppy),
+        "volatility": sigma * np.sqrt(ppy),
+        "sharpe": sharpe,
+        "sortino": sortino,
+        "total return": W @ moments.cum,
+        "weekly return": mu * 52,
+        "daily return": mu * 252,
+    }
+
+
+def _ratio_objective(mu: np.ndarray, cov: np.ndarray, rf: float, ppy: int):
+    """Negative annualised (mu·w - rf) / sqrt(w'Σw) and its gradient."""
+    sqrt_ppy = np.sqrt(ppy)
+
+    def f(w: np.ndarray) -> tuple[float, np.ndarray]:
+        cw = cov @ w
+        sigma = np.sqrt(w @ cw)
+        excess = _annualise(mu @ w, ppy) - rf
+        value = excess / (sigma * sqrt_ppy)
+        grad = (ppy * mu / sigma - excess * cw / sigma**3) / sqrt_ppy
+        return -value, -grad
+
+    return f
+
+
+def _linear_objective(coef: np.ndarray):
+    """Negative coef·w and its (constant) gradient."""
+    def f(w: np.ndarray) -> tuple[float, np.ndarray]:
+        return -(coef @ w), -coef
+
+    return f
+
+
+def _objective(metric: str, moments: Moments, rf: float = 0.0, ppy: int = 252):
+    """Build the ``w -> (-metric, -gradient)`` callable for *metric*."""
+    m = metric.lower()
+    if m == "sharpe":
+        return _ratio_objective(moments.mean, moments.cov, rf, ppy)
+    if m == "sortino":
+        return _ratio_objective(moments.mean, moments.downside_cov, rf, ppy)
+    if m == "total return":
+        return _linear_objective(moments.cum)
+    if m == "weekly return":
+        return _linear_objective(moments.mean * 52)
+    if m == "daily return":
+        return _linear_objective(moments.mean * 252)
+    raise ValueError(f"Unsupported metric '{metric}'")
+
 # ─────────────────────────────────────────────────────────────────────
 #  OPTIMISATION
 # ─────────────────────────────────────────────────────────────────────
 
+def _minimize(*args, **kwargs):
+    """``scipy.optimize.minimize``; scipy is imported by the first solve, not with this module."""
+    from scipy.optimize import minimize
+    return minimize(*args, **kwargs)
+
+
+# Above this many assets optimise_weights uses the projected-gradient solver
+# (O(n) per step plus one covariance product) instead of SLSQP, whose dense
+# QP subproblems grow as O(n³)
+LARGE_UNIVERSE_ASSETS = 300
+
+# Largest step (in weight units per unit of gradient) the projected-gradient
+# solver takes, also used when the curvature along a step is not positive
+# (linear objectives). Keeps y - t in _project_budget well scaled
+SPG_MAX_STEP = 1e4
+
+
+def _project_budget(y: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Euclidean projection of *y* onto {w : sum(w) == 1, lo <= w <= hi}.
+
+    The projection is clip(y - t, lo, hi) for the shift t that makes it sum
+    to 1; that sum is monotone in t, so t is found by bisection. The residual
+    left by rounding is then spread over the coordinates strictly inside
+    their bounds, so the budget holds to machine precision.
+    """
+    t_lo, t_hi = np.min(y - hi), np.max(y - lo)
+    for _ in range(100):
+        t = (t_lo + t_hi) / 2
+        if np.clip(y - t, lo, hi).sum() > 1:
+            t_lo = t
+        else:
+            t_hi = t
+        if t_hi - t_lo <= 1e-15 * max(1.0, abs(t)):
+            break
+    w = np.clip(y - (t_lo + t_hi) / 2, lo, hi)
+    for _ in range(3):
+        free = (w > lo) & (w < hi)
+        residual = 1 - w.sum()
+        if not free.any() or abs(residual) <= 1e-15:
+            break
+        w[free] = np.clip(w[free] + residual / free.sum(), lo[free], hi[free])
+    return w
+
+
+def _minimize_projected(
+    fun, x0: np.ndarray, lo: np.ndarray, hi: np.ndarray, tol: float = 1e-9, ftol: float = 1e-12, max_iter: int = 5000,
+):
+    """Spectral projected gradient (Barzilai-Borwein steps, Armijo backtracking)
+    on the fully-invested box; *fun* returns (value, gradient) like for SLSQP.
+
+    Stops when the projected gradient step is below *tol*, or when a step
+    improves the objective by less than *ftol* (relative). If backtracking
+    cannot find a sufficient decrease, the current point is returned with
+    ``success=False``; a worse point is never accepted.
+    """
+    from scipy.optimize import OptimizeResult
+
+    x = _project_budget(x0, lo, hi)
+    f, g = fun(x)
+    step = 1.0 / max(np.abs(_project_budget(x - g, lo, hi) - x).max(), 1e-12)
+    for it in range(1, max_iter + 1):
+        if np.abs(_project_budget(x - g, lo, hi) - x).max() < tol:
+            return OptimizeResult(x=x, fun=f, nit=it, success=True, message="Optimization terminated successfully")
+        d = _project_budget(x - step * g, lo, hi) - x
+        lam, slope = 1.0, g @ d
+        while True:
+            x_new = x + lam * d
+            f_new, g_new = fun(x_new)
+            if f_new <= f + 1e-4 * lam * slope:
+                break
+            lam /= 2
+            if lam < 1e-12:
+                return OptimizeResult(x=x, fun=f, nit=it, success=False, message="Line search failed")
+        s, y = x_new - x, g_new - g
+        sy = s @ y
+        step = min(max((s @ s) / sy, 1e-10), SPG_MAX_STEP) if sy > 0 else SPG_MAX_STEP
+        converged = f - f_new <= ftol * max(1.0, abs(f))
+        x, f, g = x_new, f_new, g_new
+        if converged:
+            return OptimizeResult(x=x, fun=f, nit=it, success=True, message="Optimization terminated successfully")
+    return OptimizeResult(x=x, fun=f, nit=max_iter, success=False, message="Iteration limit reached")
+
+
+def _bounds(n: int, allow_short: bool, max_long: float, max_short: float) -> list[tuple[float, float]]:
+    if allow_short:
+        return [(-max_short, max_long) for _ in range(n)]
+    return [(0.0, max_long) for _ in range(n)]
+
+
+def _budget_constraint(n: int) -> dict:
+    """Fully-invested constraint sum(w) == 1, with its Jacobian."""
+    ones = np.ones(n)
+    return {"type": "eq", "fun": lambda w: np.sum(w) - 1, "jac": lambda w: ones}
+
+
 def optimise_weights(
     returns: pd.DataFrame,
     metric: str = "sharpe",
@@ -81,9 +465,15 @@ def optimise_weights(
     allow_short: bool = False,
     max_long: float = 1.0,
     max_short: float = 1.0,
+    moments: Moments | None = None,
+    cov_method: str = "sample",
+    n_samples: int = 0,
 ) -> np.ndarray:
     """Optimise portfolio weights based on *metric*.
 
+    Moments are computed once up front and SLSQP runs on plain ndarrays with
+    analytic gradients, so no iteration touches the return DataFrame.
+
     Parameters
     ----------
     returns : DataFrame
@@ -96,37 +486,251 @@ def optimise_weights(
         Upper bound per asset for long positions.
     max_short : float, optional
         Lower bound (negative) per asset for short positions. Ignored if allow_short == False.
+    moments : Moments, optional
+        Precomputed moments of *returns*, to share them between several solves.
+    cov_method : str, optional
+        Covariance estimator (see COV_METHODS) when *moments* is not given.
+    n_samples : int, optional
+        If > 0, the solver starts from the best of this many random portfolios
+        (``random_portfolios``, fixed seed) instead of equal weights.
+
+    Universes larger than LARGE_UNIVERSE_ASSETS are solved by projected
+    gradient instead of SLSQP; with ``cov_method="factor"`` every step is
+    then O(n·k). When such a universe has no more periods than assets, the
+    sample covariance is singular and Sharpe/Sortino are unbounded, so
+    ratio metrics switch to ``ledoit_wolf``.
     """
-    n = returns.shape[1]
+    if moments is None:
+        moments = Moments(returns, cov_method)
+    obj = _objective(metric, moments)
+
+    n = moments.n_assets
     x0 = np.full(n, 1 / n)
+    if n_samples > 0:
+        _, best = random_portfolios(
+            returns, n_samples, metric=metric, allow_short=allow_short,
+            max_long=max_long, max_short=max_short, moments=moments, seed=0,
+        )
+        x0 = best.iloc[0].to_numpy()
+    bounds = _bounds(n, allow_short, max_long, max_short)
 
-    # Define bounds -----------------------------------------------------------
-    if allow_short:
-        bounds = [(-max_short, max_long) for _ in range(n)]
+    if n > LARGE_UNIVERSE_ASSETS:
+        lo, hi = np.array(bounds).T
+        if lo.sum() > 1 or hi.sum() < 1:
+            raise ValueError("Weight bounds cannot sum to 1")
+        if moments.cov_method == "sample" and len(returns) <= n and metric.lower() in ("sharpe", "sortino"):
+            moments = Moments(returns, "ledoit_wolf")
+            obj = _objective(metric, moments)
+        res = _minimize_projected(obj, x0, lo, hi)
     else:
-        bounds = [(0.0, max_long) for _ in range(n)]
-
-    cons = [{"type": "eq", "fun": lambda w: np.sum(w) - 1}]
-
-    def obj(w: np.ndarray) -> float:
-        m = metric.lower()
-        if m == "sharpe":
-            return -sharpe_ratio(w, returns)
-        if m == "sortino":
-            return -sortino_ratio(w, returns)
-        if m == "total return":
-            return -total_return(w, returns)
-        if m == "weekly return":
-            return -periodic_avg_return(w, returns, "weekly")
-        if m == "daily return":
-            return -periodic_avg_return(w, returns, "daily")
-        raise ValueError(f"Unsupported metric '{metric}'")
-
-    res = minimize(obj, x0, bounds=bounds, constraints=cons, method="SLSQP")
+        res = _minimize(obj, x0, jac=True, bounds=bounds, constraints=[_budget_constraint(n)], method="SLSQP")
+    observe("solver_iterations", res.nit, metric=metric.lower() if metric.lower() in METRICS else "other")
     if not res.success:
         raise RuntimeError(res.message)
     return res.x
 
+
+def efficient_frontier(
+    returns: pd.DataFrame,
+    n_points: int = 20,
+    *,
+    allow_short: bool = False,
+    max_long: float = 1.0,
+    max_short: float = 1.0,
+    moments: Moments | None = None,
+    cov_method: str = "sample",
+    ppy: int = 252,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Mean-variance efficient frontier with *n_points* portfolios.
+
+    The frontier runs from the minimum-variance portfolio to the
+    maximum-return portfolio. Intermediate points minimise variance for an
+    evenly spaced target return; each solve is warm-started from the
+    previous point's weights and all of them share one covariance matrix.
+
+    Returns
+    -------
+    (points, weights)
+        *points* has annualised "return", "volatility" and "sharpe" columns;
+        *weights* has one column per asset. Both are indexed by point number.
+        Points whose solve fails are dropped. *cov_method* selects the
+        covariance estimator (see COV_METHODS) when *moments* is not given.
+    """
+    if moments is None:
+        moments = Moments(returns, cov_method)
+    mu, cov = moments.mean, moments.cov
+    n = moments.n_assets
+    bounds = _bounds(n, allow_short, max_long, max_short)
+    lo, hi = np.array(bounds).T
+    if lo.sum() > 1 or hi.sum() < 1:
+        raise ValueError("Weight bounds cannot sum to 1")
+    budget = _budget_constraint(n)
+
+    def variance(w: np.ndarray) -> tuple[float, np.ndarray]:
+        cw = cov @ w
+        return w @ cw, 2 * cw
+
+    # Left end: minimum variance ----------------------------------------------
+    res = _minimize(variance, np.full(n, 1 / n), jac=True, bounds=bounds, constraints=[budget], method="SLSQP")
+    if not res.success:
+        raise RuntimeError(res.message)
+    w_min = res.x
+
+    # Right end: maximum return (a box-constrained LP, solved greedily) -------
+    w_max = lo.copy()
+    left = 1 - lo.sum()
+    for i in np.argsort(-mu):
+        step = min(hi[i] - lo[i], left)
+        w_max[i] += step
+        left -= step
+
+    # Warm-started solves along the target-return grid ------------------------
+    targets = np.linspace(mu @ w_min, mu @ w_max, max(n_points, 2))
+    solved = [w_min]
+    w = w_min
+    for target in targets[1:-1]:
+        cons = [budget, {"type": "eq", "fun": lambda x, t=target: mu @ x - t, "jac": lambda x: mu}]
+        res = _minimize(variance, w, jac=True, bounds=bounds, constraints=cons, method="SLSQP")
+        if res.success:
+            w = res.x
+            solved.append(w)
+    solved.append(w_max)
+
+    weights = pd.DataFrame(solved, columns=moments.columns)
+    W = weights.to_numpy()
+    ann_ret = _annualise(W @ mu, ppy)
+    ann_vol = np.sqrt(np.einsum("ij,ij->i", W @ cov, W) * ppy)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = ann_ret / ann_vol
+    points = pd.DataFrame({"return": ann_ret, "volatility": ann_vol, "sharpe": sharpe})
+    return points, weights
+
+# ─────────────────────────────────────────────────────────────────────
+#  RANDOM PORTFOLIOS
+# ─────────────────────────────────────────────────────────────────────
+
+def _fill_budget(W: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Shift each row of *W* (within [lo, hi]) so that it sums to 1.
+
+    The missing (or excess) weight is spread in proportion to each asset's
+    room to its upper (or lower) bound, which keeps every row in bounds
+    whenever lo.sum() <= 1 <= hi.sum().
+    """
+    gap = 1 - W.sum(axis=1, keepdims=True)
+    room = np.where(gap > 0, hi - W, W - lo)
+    total = room.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        W += np.where(total > 0, gap * room / total, 0.0)
+    return W
+
+
+def random_weights(
+    n_assets: int,
+    n_portfolios: int,
+    *,
+    allow_short: bool = False,
+    max_long: float = 1.0,
+    max_short: float = 1.0,
+    rng: np.random.Generator | None = None,
+) -> np.ndarray:
+    """Sample fully-invested weight vectors within the optimiser's bounds.
+
+    Long-only weights are drawn from a flat Dirichlet distribution (clipped
+    to *max_long* and re-balanced when that bound binds). With
+    *allow_short*, weights are drawn uniformly in [-max_short, max_long] per
+    asset and shifted onto sum(w) == 1.
+
+    Returns
+    -------
+    ndarray
+        (n_portfolios, n_assets) matrix, one portfolio per row.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    lo, hi = np.array(_bounds(n_assets, allow_short, max_long, max_short)).T
+    if lo.sum() > 1 or hi.sum() < 1:
+        raise ValueError("Weight bounds cannot sum to 1")
+
+    if allow_short:
+        W = lo + (hi - lo) * rng.random((n_portfolios, n_assets))
+    else:
+        # Normalised exponentials are Dirichlet(1, ..., 1) samples
+        W = rng.standard_exponential((n_portfolios, n_assets))
+        W /= W.sum(axis=1, keepdims=True)
+        if max_long >= 1:
+            return W
+        np.minimum(W, hi, out=W)
+    return _fill_budget(W, lo, hi)
+
+
+def random_portfolios(
+    returns: pd.DataFrame,
+    n_portfolios: int = 10_000,
+    *,
+    metric: str = "sharpe",
+    allow_short: bool = False,
+    max_long: float = 1.0,
+    max_short: float = 1.0,
+    moments: Moments | None = None,
+    cov_method: str = "sample",
+    n_best: int = 1,
+    seed: int | None = None,
+    ppy: int = 252,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Monte Carlo cloud of random portfolios, scored in batches.
+
+    Portfolios are sampled with ``random_weights`` and evaluated with
+    ``portfolio_metrics`` chunk by chunk, so memory stays within
+    RANDOM_CHUNK_BYTES whatever *n_portfolios* is (up to
+    MAX_RANDOM_PORTFOLIOS). Only the weights of the *n_best* portfolios
+    (by *metric*) are kept. *cov_method* selects the covariance estimator
+    (see COV_METHODS) when *moments* is not given.
+
+    Returns
+    -------
+    (points, best)
+        *points* has "return", "volatility", "sharpe", "sortino" and
+        "total_return" columns, one row per portfolio; *best* has one column
+        per asset and the *n_best* best portfolios as rows, best first, both
+        indexed by portfolio number.
+    """
+    if not 0 < n_portfolios <= MAX_RANDOM_PORTFOLIOS:
+        raise ValueError(f"n_portfolios must be between 1 and {MAX_RANDOM_PORTFOLIOS}")
+    if moments is None:
+        moments = Moments(returns, cov_method)
+    m = metric.lower()
+    if m not in METRICS:
+        raise ValueError(f"Unsupported metric '{metric}'")
+    n = moments.n_assets
+    rng = np.random.default_rng(seed)
+
+    # Weights plus the two covariance products are the largest per-chunk arrays
+    chunk = max(1, min(n_portfolios, RANDOM_CHUNK_BYTES // (3 * 8 * n)))
+    columns = {"return": "return", "volatility": "volatility", "sharpe": "sharpe", "sortino": "sortino", "total return": "total_return"}
+    points = {col: np.empty(n_portfolios) for col in columns.values()}
+    best_score = np.empty(0)
+    best_index = np.empty(0, dtype=int)
+    best_weights = np.empty((0, n))
+
+    for start in range(0, n_portfolios, chunk):
+        k = min(chunk, n_portfolios - start)
+        W = random_weights(n, k, allow_short=allow_short, max_long=max_long, max_short=max_short, rng=rng)
+        stats = portfolio_metrics(W, moments, ppy=ppy)
+        for key, col in columns.items():
+            points[col][start:start + k] = stats[key]
+
+        # Keep the running top n_best of (previous best + this chunk)
+        score = np.nan_to_num(stats[m], nan=-np.inf)
+        top = np.argpartition(-score, n_best - 1)[:n_best] if n_best < k else np.arange(k)
+        best_score = np.concatenate([best_score, score[top]])
+        best_index = np.concatenate([best_index, start + top])
+        best_weights = np.concatenate([best_weights, W[top]])
+        order = np.argsort(-best_score, kind="stable")[:n_best]
+        best_score, best_index, best_weights = best_score[order], best_index[order], best_weights[order]
+
+    points = pd.DataFrame(points)
+    best = pd.DataFrame(best_weights, index=best_index, columns=moments.columns)
+    return points, best
+
 # ─────────────────────────────────────────────────────────────────────
 #  CONVENIENCE
 # ─────────────────────────────────────────────────────────────────────
@@ -136,3 +740,35 @@ def compute_portfolio_series(returns: pd.DataFrame, weights: np.ndarray) -> pd.S
     port = (returns * weights).sum(axis=1)
     cum_pct = ((1 + port).cumprod() - 1) * 100
     return cum_pct
+
+
+def downsample_series(series: pd.Series, max_points: int) -> pd.Series:
+    """Shape-preserving downsampling (Largest-Triangle-Three-Buckets).
+
+    Keeps the first and last points and, in each of ``max_points - 2``
+    buckets, the point forming the largest triangle with its neighbours, so
+    peaks and troughs survive. Points are spaced by position, not time.
+    """
+    n = len(series)
+    if max_points >= n:
+        return series
+    if max_points < 3:
+        raise ValueError("max_points must be at least 3")
+
+    y = series.to_numpy(dtype=float)
+    every = (n - 2) / (max_points - 2)
+    keep = np.empty(max_points, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        nxt_hi = min(int((i + 2) * every) + 1, n)
+        # Average of the next bucket (the last point for the final bucket)
+        avg_x = (hi + nxt_hi - 1) / 2 if nxt_hi > hi else n - 1
+        avg_y = y[hi:nxt_hi].mean() if nxt_hi > hi else y[-1]
+        xs = np.arange(lo, hi)
+        area = np.abs((a - avg_x) * (y[lo:hi] - y[a]) - (a - xs) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return series.iloc[keep]
@@ -1,14 +1,22 @@
 from pathlib import Path
 from typing import Optional
 
+import numpy as np
 import pandas as pd
 
 from app.services.yfinance_service import fetch_prices
+from app.services.telemetry import stage
+
+from app.optimizitation.backtest import walk_forward
 
 from app.optimizitation.metrics import (
+    Moments,
     calculate_returns,
+    efficient_frontier,
     optimise_weights,
+    random_portfolios,
     compute_portfolio_series,
+    downsample_series,
     sharpe_ratio,
     sortino_ratio,
     total_return,
@@ -16,6 +24,63 @@ from app.optimizitation.metrics import (
 )
 
 
+def _canonical_date(value) -> Optional[str]:
+    if not value:
+        return None
+    ts = pd.Timestamp(value)
+    return ts.strftime("%Y-%m-%d") if ts == ts.normalize() else ts.isoformat()
+
+
+def canonical_request(
+    tickers: list[str],
+    start_date: str,
+    end_date: Optional[str] = None,
+    interval: str = "1d",
+    metric: str = "sharpe",
+    allow_short: bool = False,
+    max_long: float = 1.0,
+    max_short: float = 1.0,
+    max_points: Optional[int] = None,
+    cov_method: str = "sample",
+) -> dict:
+    """
+    Normalise ``optimize_portfolio`` arguments so that equivalent requests
+    compare equal: tickers stripped, de-duplicated and sorted, dates in ISO
+    form, metric and covariance method lower-cased, bounds as floats
+    (max_short reset when shorting is off, since it is ignored then).
+
+    Returns
+    -------
+    dict
+        Keyword arguments for ``optimize_portfolio``.
+    """
+    return {
+        "tickers": sorted({tk.strip() for tk in tickers if tk and tk.strip()}),
+        "start_date": _canonical_date(start_date),
+        "end_date": _canonical_date(end_date),
+        "interval": interval.strip(),
+        "metric": metric.strip().lower(),
+        "allow_short": bool(allow_short),
+        "max_long": float(max_long),
+        "max_short": float(max_short) if allow_short else 1.0,
+        "max_points": int(max_points) if max_points else None,
+        "cov_method": cov_method.strip().lower(),
+    }
+
+
+def _load_returns(tickers: list[str], start_date: str, end_date: Optional[str], interval: str) -> pd.DataFrame:
+    """Download prices and turn them into a return matrix, timing both stages."""
+    with stage("fetch_prices"):
+        prices = fetch_prices(
+            tickers=tickers,
+            start_date=start_date,
+            end_date=end_date,
+            interval=interval,
+        )
+    with stage("calculate_returns"):
+        return calculate_returns(prices, interval)
+
+
 def _evaluate_metric(metric: str, weights, returns) -> float:
     m = metric.lower()
     if m == "sharpe":
@@ -31,6 +96,38 @@ def _evaluate_metric(metric: str, weights, returns) -> float:
     raise ValueError(f"Unsupported metric '{metric}'")
 
 
+def _solve(
+    returns: pd.DataFrame,
+    moments: Moments,
+    metric: str,
+    allow_short: bool,
+    max_long: float,
+    max_short: float,
+    max_points: Optional[int] = None,
+) -> dict:
+    """Optimise one metric/constraint combination on an already computed return matrix."""
+    with stage("solve"):
+        weights = optimise_weights(
+            returns,
+            metric=metric,
+            allow_short=allow_short,
+            max_long=max_long,
+            max_short=max_short,
+            moments=moments,
+        )
+    weights_dict = {tk: float(round(w, 6)) for tk, w in zip(returns.columns, weights)}
+    score = _evaluate_metric(metric, weights, returns)
+    cum_pct = compute_portfolio_series(returns, weights)
+    if max_points:
+        cum_pct = downsample_series(cum_pct, max_points)
+
+    return {
+        "weights": weights_dict,
+        "score": float(round(score, 6)),
+        "cum_returns": cum_pct,
+    }
+
+
 def optimize_portfolio(
     tickers: list[str],
     start_date: str,
@@ -40,6 +137,8 @@ def optimize_portfolio(
     allow_short: bool = False,
     max_long: float = 1.0,
     max_short: float = 1.0,
+    max_points: Optional[int] = None,
+    cov_method: str = "sample",
 ) -> dict:
     """
     Compute the optimal portfolio allocation based on a selected metric.
@@ -62,33 +161,232 @@ def optimize_portfolio(
         Max weight per asset.
     max_short : float
         Max short weight per asset (only if allow_short=True).
+    max_points : int, optional
+        If set, cum_returns is downsampled (LTTB) to at most this many points.
+    cov_method : str
+        Covariance estimator used by the optimiser: 'sample' (default),
+        'ledoit_wolf' (shrinkage) or 'factor' (low-rank factor model, for
+        large universes). The reported score always uses sample statistics.
 
     Returns
     -------
     dict
         { 'weights': {ticker: weight, ...}, 'score': float, 'cum_returns': pd.Series }
     """
-    prices = fetch_prices(
-        tickers=tickers,
-        start_date=start_date,
-        end_date=end_date,
-        interval=interval,
-    )
-
-    returns = calculate_returns(prices, interval)
-    weights = optimise_weights(
-        returns,
-        metric=metric,
-        allow_short=allow_short,
-        max_long=max_long,
-        max_short=max_short,
-    )
-    weights_dict = {tk: float(round(w, 6)) for tk, w in zip(returns.columns, weights)}
-    score = _evaluate_metric(metric, weights, returns)
-    cum_pct = compute_portfolio_series(returns, weights)
+    returns = _load_returns(tickers, start_date, end_date, interval)
+    return _solve(returns, Moments(returns, cov_method), metric, allow_short, max_long, max_short, max_points)
+
+
+def optimize_portfolio_batch(
+    tickers: list[str],
+    start_date: str,
+    end_date: Optional[str] = None,
+    interval: str = "1d",
+    specs: Optional[list[dict]] = None,
+    max_points: Optional[int] = None,
+    cov_method: str = "sample",
+) -> list[dict]:
+    """
+    Solve several metric/constraint combinations on the same ticker set.
+
+    Prices are fetched and returns computed once; every spec is then solved
+    against the shared return matrix and moments.
+
+    Parameters
+    ----------
+    tickers, start_date, end_date, interval
+        As in ``optimize_portfolio``.
+    specs : list of dict
+        Each with optional keys 'metric' (default 'sharpe'), 'allow_short'
+        (default False), 'max_long' (default 1.0) and 'max_short' (default 1.0).
+    max_points, cov_method
+        As in ``optimize_portfolio``.
+
+    Returns
+    -------
+    list of dict
+        One entry per spec, in order: the spec's settings plus either
+        'result' (as returned by ``optimize_portfolio``) or 'error'.
+    """
+    specs = specs or [{}]
+    returns = _load_returns(tickers, start_date, end_date, interval)
+    moments = Moments(returns, cov_method)
+
+    results = []
+    for spec in specs:
+        entry = {
+            "metric": spec.get("metric", "sharpe"),
+            "allow_short": spec.get("allow_short", False),
+            "max_long": spec.get("max_long", 1.0),
+            "max_short": spec.get("max_short", 1.0),
+        }
+        try:
+            entry["result"] = _solve(returns, moments, **entry, max_points=max_points)
+        except Exception as exc:
+            entry["error"] = str(exc)
+        results.append(entry)
+    return results
+
+
+def frontier_portfolio(
+    tickers: list[str],
+    start_date: str,
+    end_date: Optional[str] = None,
+    interval: str = "1d",
+    n_points: int = 20,
+    allow_short: bool = False,
+    max_long: float = 1.0,
+    max_short: float = 1.0,
+    cov_method: str = "sample",
+) -> list[dict]:
+    """
+    Compute the mean-variance efficient frontier for a ticker set
+    (*cov_method* as in ``optimize_portfolio``).
+
+    Returns
+    -------
+    list of dict
+        One entry per frontier point, from minimum variance to maximum return:
+        { 'return': float, 'volatility': float, 'sharpe': float | None,
+          'weights': {ticker: weight, ...} } (return and volatility annualised).
+    """
+    returns = _load_returns(tickers, start_date, end_date, interval)
+    with stage("solve"):
+        points, weights = efficient_frontier(
+            returns,
+            n_points,
+            allow_short=allow_short,
+            max_long=max_long,
+            max_short=max_short,
+            cov_method=cov_method,
+        )
+
+    frontier = []
+    for (_, pt), (_, w) in zip(points.iterrows(), weights.iterrows()):
+        frontier.append({
+            "return": float(round(pt["return"], 6)),
+            "volatility": float(round(pt["volatility"], 6)),
+            "sharpe": float(round(pt["sharpe"], 6)) if np.isfinite(pt["sharpe"]) else None,
+            "weights": {tk: float(round(v, 6)) for tk, v in w.items()},
+        })
+    return frontier
+
+
+def random_portfolio_cloud(
+    tickers: list[str],
+    start_date: str,
+    end_date: Optional[str] = None,
+    interval: str = "1d",
+    n_portfolios: int = 10_000,
+    n_points: int = 2000,
+    metric: str = "sharpe",
+    allow_short: bool = False,
+    max_long: float = 1.0,
+    max_short: float = 1.0,
+    seed: Optional[int] = None,
+    cov_method: str = "sample",
+) -> dict:
+    """
+    Sample *n_portfolios* random portfolios and score them all (Monte Carlo),
+    with volatilities from the *cov_method* estimator.
+
+    Returns
+    -------
+    dict
+        { 'points': [{'return', 'volatility', 'sharpe', 'sortino',
+          'total_return'}, ...] (the first *n_points* samples, for a scatter
+          plot), 'best': {'weights': {ticker: weight, ...}, 'return',
+          'volatility', 'sharpe', 'sortino', 'total_return'} (best by *metric*) }
+    """
+    returns = _load_returns(tickers, start_date, end_date, interval)
+    with stage("solve"):
+        points, best = random_portfolios(
+            returns,
+            n_portfolios,
+            metric=metric,
+            allow_short=allow_short,
+            max_long=max_long,
+            max_short=max_short,
+            seed=seed,
+            cov_method=cov_method,
+        )
+
+    def _records(frame: pd.DataFrame) -> list[dict]:
+        # Rounded, with undefined ratios (zero volatility) as None
+        frame = frame.round(6)
+        return frame.astype(object).where(np.isfinite(frame), None).to_dict("records")
 
     return {
-        "weights": weights_dict,
+        "points": _records(points.head(n_points)),
+        "best": _records(points.loc[best.index[:1]])[0] | {
+            "weights": {tk: float(round(w, 6)) for tk, w in best.iloc[0].items()},
+        },
+    }
+
+
+def backtest_returns(
+    tickers: list[str],
+    start_date: str,
+    end_date: Optional[str] = None,
+    interval: str = "1d",
+) -> pd.DataFrame:
+    """
+    Return matrix of a backtest, for callers that fit its rebalance blocks
+    (``backtest.fit_block``) in several workers before ``backtest_portfolio``.
+    """
+    return _load_returns(tickers, start_date, end_date, interval)
+
+
+def backtest_portfolio(
+    tickers: list[str],
+    start_date: str,
+    end_date: Optional[str] = None,
+    interval: str = "1d",
+    metric: str = "sharpe",
+    lookback: int = 252,
+    rebalance_every: int = 21,
+    expanding: bool = False,
+    allow_short: bool = False,
+    max_long: float = 1.0,
+    max_short: float = 1.0,
+    returns: Optional[pd.DataFrame] = None,
+    fitted: Optional[list] = None,
+) -> dict:
+    """
+    Walk-forward backtest: re-optimise every *rebalance_every* periods on the
+    previous *lookback* periods (or all of them if *expanding*) and chain the
+    out-of-sample returns. Prices are downloaded once, unless *returns*
+    (``backtest_returns``) is given; *fitted* is passed on to ``walk_forward``.
+
+    Returns
+    -------
+    dict
+        { 'weights': {date: {ticker: weight, ...}, ...}, 'score': float,
+          'cum_returns': pd.Series } where score is *metric* evaluated on the
+        out-of-sample portfolio returns.
+    """
+    if returns is None:
+        returns = _load_returns(tickers, start_date, end_date, interval)
+    with stage("solve"):
+        bt = walk_forward(
+            returns,
+            metric,
+            lookback=lookback,
+            rebalance_every=rebalance_every,
+            expanding=expanding,
+            allow_short=allow_short,
+            max_long=max_long,
+            max_short=max_short,
+            fitted=fitted,
+        )
+    oos = bt["returns"].to_frame("portfolio")
+    score = _evaluate_metric(metric, np.ones(1), oos)
+
+    return {
+        "weights": {
+            str(date): {tk: float(round(w, 6)) for tk, w in row.items()}
+            for date, row in bt["weights"].iterrows()
+        },
         "score": float(round(score, 6)),
-        "cum_returns": cum_pct,
+        "cum_returns": bt["cum_returns"],
     }
@@ -1,17 +1,76 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi.responses import StreamingResponse
 from app.core.firebase_init import db
 from app.core.firebase_auth import verify_token
 import uuid
 from app.services.yfinance_service import get_stock_data
 from app.models.portfolio import Portfolio
-from app.core.firebase_watchlist import get_all_stocks_firebase
-from app.core.firebase_portfolio import create_new_portfolio_firebase, get_user_portfolios_firebase, delete_portfolio_firebase, get_portfolio_firebase
-from app.optimizitation.optimize import optimize_portfolio
+from app.core.firebase_watchlist import get_invalid_tickers
+from app.core.firebase_portfolio import create_new_portfolio_firebase, get_user_portfolios_firebase, delete_portfolio_firebase, get_portfolio_firebase, get_portfolio_last_date_firebase, append_portfolio_performance_firebase
+from app.optimizitation.optimize import optimize_portfolio, optimize_portfolio_batch, frontier_portfolio, random_portfolio_cloud, backtest_portfolio, backtest_returns, canonical_request
+from app.optimizitation.backtest import rebalance_blocks, fit_block
+from app.services.optimize_jobs import MAX_WORKERS, run_in_pool, submit_job, get_job
+from app.services.single_flight import AsyncSingleFlight
+from app.services.result_cache import get_result_cache
+import asyncio
 import datetime
+import json
 
 
 router = APIRouter(prefix="/api/portfolios", tags=["Portfolios"])
 
+# Number of cum_returns points per NDJSON line in /optimize/stream
+STREAM_CHUNK_POINTS = 5000
+
+# Largest number of points /frontier computes (one solve per point)
+FRONTIER_MAX_POINTS = 200
+
+# Limits of /random: portfolios sampled, sampled weights in total
+# (portfolios x tickers), and points returned for the scatter
+RANDOM_MAX_PORTFOLIOS = 100_000
+RANDOM_MAX_WEIGHTS = 10_000_000
+RANDOM_MAX_POINTS = 10_000
+
+# Identical optimizations in flight share one computation
+_optimize_flights = AsyncSingleFlight("optimize")
+
+async def _optimize(**params) -> dict:
+    """optimize_portfolio in the worker pool: served from the result cache when
+    possible, and coalesced with identical requests in flight otherwise."""
+    request = canonical_request(**params)
+    cache = get_result_cache()
+    if cache is not None and (result := cache.get(request)) is not None:
+        return result
+
+    async def compute():
+        result = await run_in_pool(optimize_portfolio, **request)
+        if cache is not None:
+            cache.put(request, result)
+        return result
+
+    key = tuple((k, tuple(v) if isinstance(v, list) else v) for k, v in request.items())
+    return await _optimize_flights.do(key, compute)
+
+def _int_param(data: dict, name: str, default: int, lo: int, hi: int) -> int:
+    """Integer field *name* of a request body (or *default*); 400 unless lo <= value <= hi."""
+    value = data.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, int) or not lo <= value <= hi:
+        raise HTTPException(status_code=400, detail=f"{name} must be an integer between {lo} and {hi}")
+    return value
+
+async def _backtest(n_jobs: int, **params) -> dict:
+    """backtest_portfolio in the worker pool; with *n_jobs* > 1 its rebalance dates
+    are split into blocks fitted by up to *n_jobs* pool workers at once."""
+    if n_jobs == 1:
+        return await run_in_pool(backtest_portfolio, **params)
+
+    returns = await run_in_pool(
+        backtest_returns, params["tickers"], params["start_date"], params["end_date"], params["interval"])
+    blocks = rebalance_blocks(len(returns), params["lookback"], params["rebalance_every"], n_jobs)
+    fit = {k: params[k] for k in ("metric", "lookback", "expanding", "allow_short", "max_long", "max_short")}
+    fitted = await asyncio.gather(*(run_in_pool(fit_block, returns, block, **fit) for block in blocks))
+    return await run_in_pool(backtest_portfolio, **params, returns=returns, fitted=[w for ws in fitted for w in ws])
+
 @router.post("/optimize")
 async def optimize_new_portfolio(
 
@@ -28,17 +87,21 @@ async def optimize_new_portfolio(
         interval = data.get("interval", "1d")
         metric = data.get("metric", "sharpe")
         allow_short = data.get("allow_short", False)
+        max_points = data.get("max_points")
+        cov_method = data.get("cov_method", "sample")
 
         if not start_date:
             raise HTTPException(status_code=422, detail="start_date is required")
 
-        result = optimize_portfolio(
+        result = await _optimize(
             tickers=tickers,
             start_date=start_date,
             end_date=end_date,
             interval=interval,
             metric=metric,
             allow_short=allow_short,
+            max_points=max_points,
+            cov_method=cov_method,
         )
 
         return {
@@ -51,6 +114,281 @@ async def optimize_new_portfolio(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Optimization error: {str(e)}")
 
+@router.post("/optimize/jobs")
+async def submit_optimize_job(
+    data: dict = Body(...),
+    user=Depends(verify_token)
+):
+    try:
+
+        uid = user["localId"]
+
+        tickers = data.get("tickers", [])
+        start_date = data.get("start_date")
+        end_date = data.get("end_date")
+        interval = data.get("interval", "1d")
+        metric = data.get("metric", "sharpe")
+        allow_short = data.get("allow_short", False)
+        max_points = data.get("max_points")
+        cov_method = data.get("cov_method", "sample")
+
+        if not start_date:
+            raise HTTPException(status_code=422, detail="start_date is required")
+
+        job_id = submit_job(
+            uid,
+            optimize_portfolio,
+            tickers=tickers,
+            start_date=start_date,
+            end_date=end_date,
+            interval=interval,
+            metric=metric,
+            allow_short=allow_short,
+            max_points=max_points,
+            cov_method=cov_method,
+        )
+
+        return {"job_id": job_id, "status": "queued"}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Optimization error: {str(e)}")
+
+@router.get("/optimize/jobs/{job_id}")
+async def get_optimize_job(job_id: str, user=Depends(verify_token)):
+    uid = user["localId"]
+    job = get_job(job_id, uid)
+
+    response = {"job_id": job_id, "status": job["status"]}
+    if job["status"] == "done":
+        result = job["result"]
+        response |= {
+            "tickers": job["params"]["tickers"],
+            "optimized_weights": result["weights"],
+            "metric": job["params"]["metric"],
+            "result": result,
+        }
+    elif job["status"] == "failed":
+        response["error"] = f"Optimization error: {job['error']}"
+    return response
+
+@router.post("/optimize/stream")
+async def optimize_new_portfolio_stream(
+    data: dict = Body(...),
+    user=Depends(verify_token)
+):
+    """Same as /optimize, but streams the full-resolution cum_returns as NDJSON.
+
+    The first line holds tickers, metric, weights and score; each following
+    line holds a chunk of {"dates": [...], "values": [...]}.
+    """
+    try:
+
+        tickers = data.get("tickers", [])
+        start_date = data.get("start_date")
+        end_date = data.get("end_date")
+        interval = data.get("interval", "1d")
+        metric = data.get("metric", "sharpe")
+        allow_short = data.get("allow_short", False)
+        cov_method = data.get("cov_method", "sample")
+
+        if not start_date:
+            raise HTTPException(status_code=422, detail="start_date is required")
+
+        result = await _optimize(
+            tickers=tickers,
+            start_date=start_date,
+            end_date=end_date,
+            interval=interval,
+            metric=metric,
+            allow_short=allow_short,
+            cov_method=cov_method,
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Optimization error: {str(e)}")
+
+    cum_returns = result["cum_returns"]
+
+    def lines():
+        header = {
+            "tickers": tickers,
+            "metric": metric,
+            "optimized_weights": result["weights"],
+            "score": result["score"],
+            "points": len(cum_returns),
+        }
+        yield json.dumps(header) + "\n"
+        for i in range(0, len(cum_returns), STREAM_CHUNK_POINTS):
+            chunk = cum_returns.iloc[i:i + STREAM_CHUNK_POINTS]
+            yield json.dumps({
+                "dates": [d.isoformat() for d in chunk.index],
+                "values": chunk.round(6).tolist(),
+            }) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/optimize/batch")
+async def optimize_portfolio_specs(
+    data: dict = Body(...),
+    user=Depends(verify_token)
+):
+    try:
+
+        tickers = data.get("tickers", [])
+        start_date = data.get("start_date")
+        end_date = data.get("end_date")
+        interval = data.get("interval", "1d")
+        specs = data.get("specs", [])
+        max_points = data.get("max_points")
+
+        if not start_date:
+            raise HTTPException(status_code=422, detail="start_date is required")
+        if not specs:
+            raise HTTPException(status_code=422, detail="specs is required")
+
+        results = await run_in_pool(
+            optimize_portfolio_batch,
+            tickers=tickers,
+            start_date=start_date,
+            end_date=end_date,
+            interval=interval,
+            specs=specs,
+            max_points=max_points,
+            cov_method=data.get("cov_method", "sample"),
+        )
+
+        for entry in results:
+            if "result" in entry:
+                entry["optimized_weights"] = entry["result"]["weights"]
+
+        return {
+            "tickers": tickers,
+            "results": results,
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Optimization error: {str(e)}")
+
+@router.post("/frontier")
+async def portfolio_frontier(
+    data: dict = Body(...),
+    user=Depends(verify_token)
+):
+    try:
+
+        tickers = data.get("tickers", [])
+        start_date = data.get("start_date")
+        end_date = data.get("end_date")
+        interval = data.get("interval", "1d")
+        n_points = _int_param(data, "n_points", 20, 2, FRONTIER_MAX_POINTS)
+        allow_short = data.get("allow_short", False)
+        max_long = data.get("max_long", 1.0)
+        max_short = data.get("max_short", 1.0)
+
+        if not start_date:
+            raise HTTPException(status_code=422, detail="start_date is required")
+
+        frontier = await run_in_pool(
+            frontier_portfolio,
+            tickers=tickers,
+            start_date=start_date,
+            end_date=end_date,
+            interval=interval,
+            n_points=n_points,
+            allow_short=allow_short,
+            max_long=max_long,
+            max_short=max_short,
+            cov_method=data.get("cov_method", "sample"),
+        )
+
+        return {"tickers": tickers, "frontier": frontier}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Frontier error: {str(e)}")
+
+@router.post("/random")
+async def portfolio_random(
+    data: dict = Body(...),
+    user=Depends(verify_token)
+):
+    try:
+
+        tickers = data.get("tickers", [])
+        start_date = data.get("start_date")
+
+        if not start_date:
+            raise HTTPException(status_code=422, detail="start_date is required")
+
+        n_portfolios = _int_param(data, "n_portfolios", 10000, 1, RANDOM_MAX_PORTFOLIOS)
+        n_points = _int_param(data, "n_points", 2000, 1, RANDOM_MAX_POINTS)
+        if n_portfolios * max(len(tickers), 1) > RANDOM_MAX_WEIGHTS:
+            raise HTTPException(
+                status_code=400, detail=f"n_portfolios x tickers must not exceed {RANDOM_MAX_WEIGHTS}")
+
+        result = await run_in_pool(
+            random_portfolio_cloud,
+            tickers=tickers,
+            start_date=start_date,
+            end_date=data.get("end_date"),
+            interval=data.get("interval", "1d"),
+            n_portfolios=n_portfolios,
+            n_points=n_points,
+            metric=data.get("metric", "sharpe"),
+            allow_short=data.get("allow_short", False),
+            max_long=data.get("max_long", 1.0),
+            max_short=data.get("max_short", 1.0),
+            seed=data.get("seed"),
+            cov_method=data.get("cov_method", "sample"),
+        )
+
+        return {"tickers": tickers, **result}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Random portfolios error: {str(e)}")
+
+@router.post("/backtest")
+async def portfolio_backtest(
+    data: dict = Body(...),
+    user=Depends(verify_token)
+):
+    try:
+
+        tickers = data.get("tickers", [])
+        start_date = data.get("start_date")
+
+        if not start_date:
+            raise HTTPException(status_code=422, detail="start_date is required")
+
+        n_jobs = data.get("n_jobs", 1)
+        if not isinstance(n_jobs, int) or isinstance(n_jobs, bool) or n_jobs < 1:
+            raise HTTPException(status_code=400, detail="n_jobs must be a positive integer")
+
+        result = await _backtest(
+            min(n_jobs, MAX_WORKERS),
+            tickers=tickers,
+            start_date=start_date,
+            end_date=data.get("end_date"),
+            interval=data.get("interval", "1d"),
+            metric=data.get("metric", "sharpe"),
+            lookback=data.get("lookback", 252),
+            rebalance_every=data.get("rebalance_every", 21),
+            expanding=data.get("expanding", False),
+            allow_short=data.get("allow_short", False),
+            max_long=data.get("max_long", 1.0),
+            max_short=data.get("max_short", 1.0),
+        )
+
+        return {"tickers": tickers, "metric": data.get("metric", "sharpe"), "result": result}
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Backtest error: {str(e)}")
+
 @router.post("/optimize/{ptfid}")
 async def optimize_existing_portfolio(
     ptfid: str,
@@ -77,17 +415,21 @@ async def optimize_existing_portfolio(
         interval = data.get("interval", "1d")
         metric = data.get("metric", "sharpe")
         allow_short = data.get("allow_short", False)
+        max_points = data.get("max_points")
+        cov_method = data.get("cov_method", "sample")
 
         if not start_date:
             raise HTTPException(status_code=422, detail="start_date is required")
 
-        result = optimize_portfolio(
+        result = await _optimize(
             tickers=tickers,
             start_date=start_date,
             end_date=end_date,
             interval=interval,
             metric=metric,
             allow_short=allow_short,
+            max_points=max_points,
+            cov_method=cov_method,
         )
 
         return {
@@ -107,11 +449,9 @@ async def create_portfolio(portfolio: Portfolio, user=Depends(verify_token)):
         uid = user["localId"]
 
         # Make sure the tickers are valid
-        available_stocks = await get_all_stocks_firebase()
-        available_tickers = [stock["ticker"] for stock in available_stocks]
-        for ticker in portfolio.tickers:
-            if ticker not in available_tickers:
-                raise HTTPException(status_code=400, detail=f"Ticker {ticker} is not available")
+        invalid_tickers = await get_invalid_tickers(portfolio.tickers)
+        if invalid_tickers:
+            raise HTTPException(status_code=400, detail=f"Ticker {invalid_tickers[0]} is not available")
         
         # Make sure the weights sum to 1
         if sum(portfolio.weights) != 1:
@@ -130,7 +470,9 @@ async def create_portfolio(portfolio: Portfolio, user=Depends(verify_token)):
             raise HTTPException(status_code=400, detail="Number of weights must match number of tickers")
         
         # Get the porformance of the tickers
-        performances = get_stock_data(portfolio.tickers, start_date=portfolio.start_date)
+        performances = await asyncio.to_thread(get_stock_data, portfolio.tickers, start_date=portfolio.start_date)
+        if performances is None:
+            raise HTTPException(status_code=400, detail="Could not fetch stock data")
 
         # Multiply the performance by the weights
         performances['ptf'] = performances[portfolio.tickers].multiply(portfolio.weights, axis=1).sum(axis=1)
@@ -143,9 +485,49 @@ async def create_portfolio(portfolio: Portfolio, user=Depends(verify_token)):
         # Return the portfolio data
         return {"message": "Portfolio created successfully", "portfolio": ptf}
 
+    except HTTPException as e:
+        if e.status_code in (404, 409):
+            raise
+        raise HTTPException(status_code=400, detail=f"Error creating portfolio: {e.detail}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error creating portfolio: {str(e)}")
 
+@router.post("/refresh/{ptfid}")
+async def refresh_portfolio(ptfid: str, user=Depends(verify_token)):
+    try:
+        uid = user["localId"]
+        portfolio = await get_portfolio_last_date_firebase(uid, ptfid)
+        tickers, weights, last_date = portfolio["tickers"], portfolio["weights"], portfolio["last_date"]
+        if last_date is None:
+            raise HTTPException(status_code=400, detail="Portfolio has no stored performance")
+
+        # Only download the bars after the last stored date
+        start_date = datetime.date.fromisoformat(last_date) + datetime.timedelta(days=1)
+        performances = await asyncio.to_thread(get_stock_data, tickers, start_date=start_date)
+        if performances is None:
+            raise HTTPException(status_code=400, detail="Could not fetch stock data")
+
+        # Keep completed days only, so a partial bar for today is never stored
+        today = datetime.date.today().isoformat()
+        performances = performances[(performances["Date"] > last_date) & (performances["Date"] < today)]
+        if performances.empty:
+            return {"message": "Portfolio is already up to date", "added": 0}
+
+        performances['ptf'] = performances[tickers].multiply(weights, axis=1).sum(axis=1)
+        appended = await append_portfolio_performance_firebase(
+            uid, ptfid, performances['Date'].tolist(), performances['ptf'].tolist())
+        if not appended["added"]:
+            return {"message": "Portfolio is already up to date", "added": 0}
+
+        return {"message": "Portfolio refreshed successfully", "added": appended["added"], "stats": appended["stats"]}
+
+    except HTTPException as e:
+        if e.status_code in (403, 404):
+            raise
+        raise HTTPException(status_code=400, detail=f"Error refreshing portfolio: {e.detail}")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error refreshing portfolio: {str(e)}")
+
 @router.get("/get")
 async def get_user_portfolios(user=Depends(verify_token)):
     try:
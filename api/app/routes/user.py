@@ -5,8 +5,8 @@ from app.core.firebase_init import db
 from app.core.firebase_watchlist import get_all_stocks_firebase, add_to_watchlist_firebase, remove_from_watchlist_firebase, get_user_watchlist_firebase
 from fastapi import HTTPException
 import logging
-from app.services.yfinance_service import get_daily_performance
-import yfinance as yf
+from app.services.yfinance_service import get_quotes
+import asyncio
 
 # Configure logs
 logging.basicConfig(level=logging.INFO)
@@ -20,7 +20,7 @@ async def signup(user: UserSignup):
         logger.info(f"Attempting to sign up user with email: {user.email}")
         
         # Sign up the user with Firebase
-        created_user = signup_user(user.email, user.password)
+        created_user = await asyncio.to_thread(signup_user, user.email, user.password)
         logger.info("Firebase signup successful")
 
         # Firebase returns localId = UID
@@ -34,7 +34,7 @@ async def signup(user: UserSignup):
         }
         logger.info(f"Saving user data to Firestore: {user_data}")
         
-        db.collection("users").document(uid).set(user_data)
+        await asyncio.to_thread(db.collection("users").document(uid).set, user_data)
         logger.info("User data saved to Firestore successfully")
         
         return {
@@ -54,7 +54,7 @@ async def signup(user: UserSignup):
 async def login(user: UserLogin):
     try:
         logger.info(f"Attempting to login user with email: {user.email}")
-        logged_in_user = login_user(user.email, user.password)
+        logged_in_user = await asyncio.to_thread(login_user, user.email, user.password)
         logger.info("Login successful")
         return {"message": "Login successful", "token": logged_in_user["idToken"]}
     except Exception as e:
@@ -76,7 +76,7 @@ async def get_user_info(user=Depends(verify_token)):
 
         # Fetch user document from Firestore
         doc_ref = db.collection("users").document(uid)
-        doc = doc_ref.get()
+        doc = await asyncio.to_thread(doc_ref.get)
 
         if not doc.exists:
             logger.error(f"User info not found for UID: {uid}")
@@ -118,26 +118,15 @@ async def get_user_watchlist(user=Depends(verify_token)):
         # Save into a list
         result = {"user_id": uid, "watchlist": stock_data}
 
-        # Get daily performance and current price for each stock in the watchlist
-        performance = get_daily_performance([stock["ticker"] for stock in result["watchlist"]])
-        
-        # Get current prices using yfinance
+        # Get daily performance and current price for each stock in the watchlist (shared quote cache)
         tickers = [stock["ticker"] for stock in result["watchlist"]]
-        current_prices = yf.download(tickers, period="1d", group_by='ticker', auto_adjust=False)
+        quotes = await asyncio.to_thread(get_quotes, tickers)
 
         # Add daily performance and current price to each stock in the watchlist
         for stock in result["watchlist"]:
-            ticker = stock["ticker"]
-            if ticker in performance:
-                stock["daily_performance"] = performance[ticker]
-            else:
-                stock["daily_performance"] = None
-                
-            # Add current price
-            try:
-                stock["price"] = round(current_prices[ticker]["Close"].iloc[-1], 2)
-            except:
-                stock["price"] = None
+            quote = quotes.get(stock["ticker"], {})
+            stock["daily_performance"] = quote.get("daily_performance")
+            stock["price"] = quote.get("price")
 
         return result
 
@@ -0,0 +1,208 @@
+"""optimize_jobs.py – Off-loop execution of optimisations
+-------------------------------------------------------
+Price downloads and SLSQP solves are blocking and CPU-bound, so routes must
+not run them on the event loop. This module owns a bounded process pool and
+two ways of using it:
+
+- ``run_in_pool``: await a function call in a worker process.
+- ``submit_job`` / ``get_job``: fire-and-poll jobs with a bounded queue, for
+  long optimisations that should not hold an HTTP connection open.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import suppress
+from functools import partial
+
+from fastapi import HTTPException
+
+from app.services import telemetry
+
+__all__ = [
+    "run_in_pool",
+    "submit_job",
+    "get_job",
+    "shutdown_pool",
+]
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  INTERNAL CONSTANTS
+# ─────────────────────────────────────────────────────────────────────────────
+# Worker processes used for optimisations.
+MAX_WORKERS = int(os.getenv("OPTIMIZE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Maximum number of submitted jobs that may be queued or running at once.
+QUEUE_DEPTH = int(os.getenv("OPTIMIZE_QUEUE_DEPTH", "32"))
+
+# Seconds a finished job's result is kept for polling.
+JOB_TTL = int(os.getenv("OPTIMIZE_JOB_TTL", "3600"))
+
+_logger = logging.getLogger(__name__)
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_jobs: dict[str, dict] = {}
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  HELPER FUNCTIONS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Create the pool on first use.
+
+    Workers are spawned rather than forked: the API process runs gRPC
+    (Firestore) threads, which do not survive a fork.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _logger.info("Starting optimisation pool with %s workers", MAX_WORKERS)
+            _executor = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _reset_executor(broken: ProcessPoolExecutor) -> None:
+    """Drop a pool whose worker died; the next submission starts a fresh one.
+
+    A broken pool fails every call still queued or running on it, so those
+    jobs end up "failed" rather than pending forever.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not broken:
+            return
+        _executor = None
+    _logger.warning("Optimisation pool broken (a worker died), restarting it")
+    telemetry.count("worker_pool_restarts_total")
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _reset_if_broken(executor: ProcessPoolExecutor, fut: Future) -> None:
+    if not fut.cancelled() and isinstance(fut.exception(), BrokenProcessPool):
+        _reset_executor(executor)
+
+
+def _instrumented(fn, request_id: str, args: tuple, kwargs: dict):
+    """Worker-side wrapper: log under the caller's request id and return
+    ``(result, metrics recorded by this call)``.
+
+    On failure the metrics travel on the exception as ``telemetry``.
+    """
+    telemetry.install_log_context()
+    telemetry.set_request_id(request_id)
+    telemetry.snapshot(reset=True)
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as exc:
+        exc.telemetry = telemetry.snapshot(reset=True)
+        raise
+    return result, telemetry.snapshot(reset=True)
+
+
+def _submit(fn, args: tuple, kwargs: dict) -> Future:
+    """Submit to the pool, replacing it first if it is already known to be broken."""
+    request_id = telemetry.get_request_id()
+    executor = _get_executor()
+    try:
+        fut = executor.submit(_instrumented, fn, request_id, args, kwargs)
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        executor = _get_executor()
+        fut = executor.submit(_instrumented, fn, request_id, args, kwargs)
+    fut.add_done_callback(partial(_reset_if_broken, executor))
+    return fut
+
+
+def _prune_jobs() -> None:
+    """Forget finished jobs older than JOB_TTL."""
+    cutoff = time.time() - JOB_TTL
+    for job_id in [j for j, job in _jobs.items() if job.get("finished", float("inf")) < cutoff]:
+        del _jobs[job_id]
+
+
+def _collect(fut: Future):
+    """Unwrap an ``_instrumented`` future, merging the worker's metrics here."""
+    try:
+        result, snap = fut.result()
+    except BrokenProcessPool as exc:
+        raise RuntimeError("optimization worker stopped unexpectedly, please retry") from exc
+    except Exception as exc:
+        telemetry.merge(getattr(exc, "telemetry", []))
+        raise
+    telemetry.merge(snap)
+    return result
+
+
+def _mark_finished(job: dict, fut: Future) -> None:
+    try:
+        job["result"] = _collect(fut)
+    except Exception as exc:
+        job["error"] = str(exc)
+    job["finished"] = time.time()
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  PUBLIC API
+# ─────────────────────────────────────────────────────────────────────────────
+
+async def run_in_pool(fn, *args, **kwargs):
+    """Run ``fn(*args, **kwargs)`` in a worker process without blocking the event loop."""
+    fut = _submit(fn, args, kwargs)
+    with suppress(Exception):
+        await asyncio.wrap_future(fut)
+    return _collect(fut)
+
+
+def submit_job(uid: str, fn, **params) -> str:
+    """Queue ``fn(**params)`` for user *uid* and return its job id.
+
+    Raises HTTPException 429 when QUEUE_DEPTH jobs are already pending.
+    """
+    _prune_jobs()
+    pending = sum(1 for job in _jobs.values() if not job["future"].done())
+    if pending >= QUEUE_DEPTH:
+        raise HTTPException(status_code=429, detail="Too many optimization jobs queued, try again later")
+
+    job_id = str(uuid.uuid4())
+    job = {"uid": uid, "params": params, "created": time.time()}
+    job["future"] = _submit(fn, (), params)
+    job["future"].add_done_callback(partial(_mark_finished, job))
+    _jobs[job_id] = job
+    return job_id
+
+
+def get_job(job_id: str, uid: str) -> dict:
+    """Return ``{'job_id', 'status', 'params', 'result' | 'error'}`` for one of *uid*'s jobs.
+
+    Status is one of "queued", "running", "done" or "failed".
+    """
+    _prune_jobs()
+    job = _jobs.get(job_id)
+    if job is None or job["uid"] != uid:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    fut: Future = job["future"]
+    status = {"job_id": job_id, "params": job["params"]}
+    if "finished" not in job:
+        return status | {"status": "running" if fut.running() else "queued"}
+    if "error" in job:
+        return status | {"status": "failed", "error": job["error"]}
+    return status | {"status": "done", "result": job["result"]}
+
+
+def shutdown_pool() -> None:
+    """Stop the worker processes (called on application shutdown)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,235 @@
+"""price_cache.py – On-disk price store
+-------------------------------------
+Persists downloaded close prices as one Parquet file per (interval, ticker).
+The calendar window that has already been fetched is recorded in the file's
+own metadata, so data and coverage are always replaced together. Callers ask for the gaps between a requested
+``[start, end)`` window and the covered window, download only those, and
+merge them back.
+
+This module does no network I/O; the download side lives in
+``app.services.yfinance_service``.
+"""
+
+import json
+import logging
+import os
+import threading
+from contextlib import ExitStack, contextmanager
+from importlib.util import find_spec
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: entries are still replaced atomically, but
+    fcntl = None     # concurrent fills from several processes may be lost
+
+__all__ = [
+    "PriceCache",
+    "get_price_cache",
+]
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  INTERNAL CONSTANTS
+# ─────────────────────────────────────────────────────────────────────────────
+_DEFAULT_ROOT = Path(__file__).resolve().parents[2] / ".cache" / "prices"
+
+_logger = logging.getLogger(__name__)
+
+Coverage = tuple[pd.Timestamp, pd.Timestamp]
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  HELPER FUNCTIONS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _naive_index(index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    """Drop the timezone (keeping wall times) so naive dates can be compared."""
+    return index.tz_localize(None) if index.tz is not None else index
+
+
+def _safe_name(ticker: str) -> str:
+    return ticker.replace(os.sep, "_").replace("/", "_")
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  PUBLIC API
+# ─────────────────────────────────────────────────────────────────────────────
+
+class PriceCache:
+    """Columnar price store keyed by ticker and interval.
+
+    Coverage is a half-open ``[start, end)`` calendar window, matching the
+    semantics of ``yf.download(start=..., end=...)``. Its end is never moved
+    past today, so the (still moving) current bar is downloaded again on the
+    next request.
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self._locks: dict[tuple[str, str], threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._held = threading.local()
+
+    # Paths & locking -------------------------------------------------------
+    def _paths(self, ticker: str, interval: str) -> tuple[Path, Path]:
+        """Parquet file, and the JSON coverage sidecar of entries written by older versions."""
+        base = self.root / interval / _safe_name(ticker)
+        return base.with_suffix(".parquet"), base.with_suffix(".json")
+
+    @contextmanager
+    def lock(self, ticker: str, interval: str):
+        """Serialize read-fill-write cycles on one (ticker, interval) entry,
+        across threads and (through a lock file) across processes.
+
+        Re-entrant: a thread already holding the entry's lock passes through.
+        """
+        key = (ticker, interval)
+        held = self._held.__dict__.setdefault("keys", set())
+        if key in held:
+            yield
+            return
+        with self._locks_guard:
+            lk = self._locks.setdefault(key, threading.Lock())
+        with lk:
+            held.add(key)
+            try:
+                if fcntl is None:
+                    yield
+                    return
+                lock_path = self._paths(ticker, interval)[0].with_suffix(".lock")
+                lock_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(lock_path, "a") as fh:
+                    fcntl.flock(fh, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(fh, fcntl.LOCK_UN)
+            finally:
+                held.discard(key)
+
+    @contextmanager
+    def lock_many(self, tickers: list[str], interval: str):
+        """Hold the locks of several entries, taken in sorted order so that
+        callers locking overlapping sets cannot deadlock."""
+        with ExitStack() as stack:
+            for tk in sorted(set(tickers)):
+                stack.enter_context(self.lock(tk, interval))
+            yield
+
+    # Read / write ----------------------------------------------------------
+    def load(self, ticker: str, interval: str) -> tuple[pd.DataFrame | None, Coverage | None]:
+        """Return the cached frame and its coverage, or ``(None, None)``."""
+        data_path, meta_path = self._paths(ticker, interval)
+        if not data_path.exists():
+            return None, None
+        try:
+            frame = pd.read_parquet(data_path)
+            meta = frame.attrs.pop("coverage", None)
+            if meta is None:
+                meta = json.loads(meta_path.read_text())
+        except Exception as exc:
+            _logger.warning("%s: unreadable cache entry (%s) – ignoring", ticker, exc)
+            return None, None
+        return frame, (pd.Timestamp(meta["start"]), pd.Timestamp(meta["end"]))
+
+    def store(self, ticker: str, interval: str, frame: pd.DataFrame, coverage: Coverage) -> None:
+        """Atomically replace the cached frame and its coverage (one file, one rename)."""
+        data_path, meta_path = self._paths(ticker, interval)
+        data_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_data = data_path.with_suffix(f".parquet.{os.getpid()}.{threading.get_ident()}.tmp")
+        frame = frame.copy(deep=False)
+        frame.attrs = {"coverage": {"start": coverage[0].isoformat(), "end": coverage[1].isoformat()}}
+        try:
+            frame.to_parquet(tmp_data)
+            os.replace(tmp_data, data_path)
+            meta_path.unlink(missing_ok=True)
+        except Exception as exc:
+            _logger.warning("%s: could not write price cache (%s)", ticker, exc)
+            tmp_data.unlink(missing_ok=True)
+
+    def update(
+        self,
+        ticker: str,
+        interval: str,
+        fills: list[tuple[pd.Timestamp, pd.Timestamp, pd.DataFrame]],
+    ) -> pd.DataFrame | None:
+        """Merge freshly downloaded ``(start, end, frame)`` ranges into the entry.
+
+        The entry is re-read under its (cross-process) lock, so concurrent
+        fills of the same ticker are merged instead of overwriting each other. Returns the full
+        merged frame.
+        """
+        with self.lock(ticker, interval):
+            frame, coverage = self.load(ticker, interval)
+            parts = [frame] + [part for _, _, part in fills]
+            if all(p is None or p.empty for p in parts):
+                return None
+            merged = self.merge(parts)
+            # Head and tail fills are only contiguous around a known coverage.
+            if coverage is None and len(fills) > 1:
+                return merged
+            for start, end, _ in fills:
+                coverage = self.extend(coverage, start, end)
+            self.store(ticker, interval, merged, coverage)
+            return merged
+
+    # Window arithmetic -----------------------------------------------------
+    @staticmethod
+    def missing(coverage: Coverage | None, start: pd.Timestamp, end: pd.Timestamp) -> list[Coverage]:
+        """Head/tail ranges of ``[start, end)`` not yet covered.
+
+        Ranges always touch the existing coverage so that it stays a single
+        contiguous window once they are filled.
+        """
+        if coverage is None:
+            return [(start, end)]
+        cs, ce = coverage
+        gaps = []
+        if start < cs:
+            gaps.append((start, cs))
+        if end > ce:
+            gaps.append((ce, end))
+        return gaps
+
+    @staticmethod
+    def extend(coverage: Coverage | None, start: pd.Timestamp, end: pd.Timestamp) -> Coverage:
+        """Grow *coverage* by a filled range, capping its end at today."""
+        end = min(end, pd.Timestamp.today().normalize())
+        if coverage is None:
+            return start, max(start, end)
+        return min(coverage[0], start), max(coverage[1], end)
+
+    @staticmethod
+    def merge(parts: list[pd.DataFrame]) -> pd.DataFrame:
+        """Concatenate frames, newer rows winning on duplicated timestamps."""
+        frame = pd.concat([p for p in parts if p is not None and not p.empty])
+        frame = frame[~frame.index.duplicated(keep="last")]
+        return frame.sort_index()
+
+    @staticmethod
+    def window(frame: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """Rows of *frame* falling in ``[start, end)``."""
+        idx = _naive_index(pd.DatetimeIndex(frame.index))
+        return frame[(idx >= start) & (idx < end)]
+
+
+_cache: PriceCache | None = None
+_cache_initialised = False
+
+
+def get_price_cache() -> PriceCache | None:
+    """Process-wide cache, or None if disabled.
+
+    Controlled by ``PRICE_CACHE_ENABLED`` (default "1") and ``PRICE_CACHE_DIR``
+    (default ``api/.cache/prices``). Requires a Parquet engine (pyarrow).
+    """
+    global _cache, _cache_initialised
+    if not _cache_initialised:
+        _cache_initialised = True
+        if os.getenv("PRICE_CACHE_ENABLED", "1").lower() in ("0", "false", "no"):
+            _logger.info("Price cache disabled by PRICE_CACHE_ENABLED")
+        elif find_spec("pyarrow") is None:
+            _logger.warning("pyarrow is not installed – price cache disabled")
+        else:
+            _cache = PriceCache(os.getenv("PRICE_CACHE_DIR") or _DEFAULT_ROOT)
+    return _cache
@@ -0,0 +1,189 @@
+"""result_cache.py – Memoised optimisation results
+-----------------------------------------------
+Keeps finished ``optimize_portfolio`` results in memory, keyed on the
+canonical request (``app.optimizitation.optimize.canonical_request``).
+
+- Least recently used entries are evicted once the cache holds more than
+  ``max_bytes`` (sizes are estimated from the pickled result).
+- Windows with an ``end_date`` in the past are deterministic and never
+  expire; windows ending today (or open-ended) expire after ``ttl`` seconds.
+- With a ``directory``, historical results are also written to disk and
+  reloaded on a memory miss, so they survive restarts.
+- A result missing some requested tickers (a download failed, which
+  ``fetch_prices`` only warns about) is never kept longer than ``ttl``.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+
+from app.services.telemetry import count
+
+__all__ = [
+    "ResultCache",
+    "get_result_cache",
+]
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  INTERNAL CONSTANTS
+# ─────────────────────────────────────────────────────────────────────────────
+_logger = logging.getLogger(__name__)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  HELPER FUNCTIONS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _key(request: dict) -> str:
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+
+def _is_historical(request: dict) -> bool:
+    end = request.get("end_date")
+    return end is not None and pd.Timestamp(end) < pd.Timestamp.today().normalize()
+
+
+def _is_complete(request: dict, result: dict) -> bool:
+    """True if every requested ticker made it into the result's weights."""
+    return set(request.get("tickers", [])) <= set(result.get("weights") or {})
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  PUBLIC API
+# ─────────────────────────────────────────────────────────────────────────────
+
+class ResultCache:
+    """LRU + TTL store of optimisation results with a memory cap."""
+
+    def __init__(self, max_bytes: int, ttl: float, directory: str | Path | None = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = Path(directory) if directory else None
+        self._entries: OrderedDict[str, tuple] = OrderedDict()  # key -> (result, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    # Memory tier -----------------------------------------------------------
+    def _put(self, key: str, result: dict, size: int, expires_at: float) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (result, size, expires_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def _get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.time():
+                del self._entries[key]
+                self._bytes -= entry[1]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    # Disk tier -------------------------------------------------------------
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pkl"
+
+    def _load(self, key: str) -> bytes | None:
+        if self.directory is None:
+            return None
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as exc:
+            _logger.warning("Unreadable result cache entry %s (%s)", key, exc)
+            return None
+
+    def _save(self, key: str, blob: bytes) -> None:
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(blob)
+            os.replace(tmp, path)
+        except OSError as exc:
+            _logger.warning("Could not persist result cache entry %s (%s)", key, exc)
+            tmp.unlink(missing_ok=True)
+
+    # Public ----------------------------------------------------------------
+    def get(self, request: dict) -> dict | None:
+        """Cached result for a canonical *request*, or None."""
+        key = _key(request)
+        result = self._get(key)
+        if result is not None:
+            count("cache_lookups_total", cache="optimize", result="hit")
+            return result
+
+        blob = self._load(key)
+        if blob is not None:
+            try:
+                result = pickle.loads(blob)
+            except Exception as exc:
+                _logger.warning("Corrupt result cache entry %s (%s)", key, exc)
+            else:
+                count("cache_lookups_total", cache="optimize", result="disk_hit")
+                self._put(key, result, len(blob), float("inf"))
+                return result
+
+        count("cache_lookups_total", cache="optimize", result="miss")
+        return None
+
+    def put(self, request: dict, result: dict) -> None:
+        """Store *result* for a canonical *request*.
+
+        Only historical results covering every requested ticker are kept forever
+        (and persisted); anything else expires after ``ttl``.
+        """
+        key = _key(request)
+        blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        historical = _is_historical(request) and _is_complete(request, result)
+        self._put(key, result, len(blob), float("inf") if historical else time.time() + self.ttl)
+        if historical and self.directory is not None:
+            self._save(key, blob)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_cache: ResultCache | None = None
+_cache_initialised = False
+
+
+def get_result_cache() -> ResultCache | None:
+    """Process-wide cache, or None if disabled.
+
+    Controlled by ``OPTIMIZE_CACHE_MAX_MB`` (default 64, 0 disables),
+    ``OPTIMIZE_CACHE_TTL`` (seconds, default 300) and ``OPTIMIZE_CACHE_DIR``
+    (unset: memory only).
+    """
+    global _cache, _cache_initialised
+    if not _cache_initialised:
+        _cache_initialised = True
+        max_mb = float(os.getenv("OPTIMIZE_CACHE_MAX_MB", "64"))
+        if max_mb <= 0:
+            _logger.info("Optimization result cache disabled by OPTIMIZE_CACHE_MAX_MB")
+        else:
+            _cache = ResultCache(
+                max_bytes=int(max_mb * 1024 * 1024),
+                ttl=float(os.getenv("OPTIMIZE_CACHE_TTL", "300")),
+                directory=os.getenv("OPTIMIZE_CACHE_DIR") or None,
+            )
+    return _cache
@@ -0,0 +1,44 @@
+"""single_flight.py – Coalescing of identical in-flight calls
+---------------------------------------------------------
+The first caller for a key runs the computation; callers arriving with the
+same key while it is still running wait for it and get the same result (or
+exception). Nothing is kept once the call finishes – that is the job of a
+cache.
+
+``AsyncSingleFlight`` coalesces coroutines awaited by several requests.
+"""
+
+import asyncio
+from typing import Hashable
+
+from app.services.telemetry import count
+
+__all__ = [
+    "AsyncSingleFlight",
+]
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  PUBLIC API
+# ─────────────────────────────────────────────────────────────────────────────
+
+class AsyncSingleFlight:
+    """Event-loop single flight; *name* labels the ``coalesced_calls_total`` counter.
+
+    The computation runs as its own task, so a waiter that goes away (client
+    disconnect) does not cancel it for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn, *args, **kwargs):
+        """Await ``fn(*args, **kwargs)``, sharing it with identical calls in flight."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            count("coalesced_calls_total", call=self.name)
+        return await asyncio.shield(task)
@@ -0,0 +1,213 @@
+"""telemetry.py – Latency histograms, counters and request ids
+-----------------------------------------------------------
+A small in-process metrics registry rendered in the Prometheus text format
+at ``/metrics``, plus a request id carried through the logs.
+
+Optimisations run in worker processes (``app.services.optimize_jobs``), so
+their measurements land in the worker's registry. The pool drains it after
+every call with ``snapshot(reset=True)`` and the API process folds the
+result back in with ``merge``.
+"""
+
+import functools
+import inspect
+import logging
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+__all__ = [
+    "stage",
+    "timed",
+    "observe",
+    "count",
+    "snapshot",
+    "merge",
+    "render_metrics",
+    "get_request_id",
+    "set_request_id",
+    "install_log_context",
+]
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  INTERNAL CONSTANTS
+# ─────────────────────────────────────────────────────────────────────────────
+_SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, math.inf)
+_ITERATION_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, math.inf)
+
+# name -> (type, help, histogram buckets)
+_METRICS = {
+    "stage_seconds": ("histogram", "Time spent in each pipeline stage.", _SECONDS_BUCKETS),
+    "http_request_seconds": ("histogram", "HTTP request latency.", _SECONDS_BUCKETS),
+    "solver_iterations": ("histogram", "Optimizer iterations per solve (SLSQP, or projected gradient for large universes).", _ITERATION_BUCKETS),
+    "yahoo_download_events_total": ("counter", "Yahoo Finance retries, fallbacks and failures.", None),
+    "cache_lookups_total": ("counter", "Cache lookups by cache and result.", None),
+    "coalesced_calls_total": ("counter", "Calls served by an identical call already in flight.", None),
+    "worker_pool_restarts_total": ("counter", "Optimisation pools replaced after a worker died.", None),
+}
+
+LOG_FORMAT = "%(levelname)s:%(name)s:[%(request_id)s] %(message)s"
+
+# (name, ((label, value), ...)) -> float for counters, [bucket counts..., sum, count] for histograms
+_values: dict[tuple, float | list] = {}
+_lock = threading.Lock()
+
+_request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  HELPER FUNCTIONS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _key(name: str, labels: dict) -> tuple:
+    if name not in _METRICS:
+        raise KeyError(f"Unknown metric '{name}'")
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels, extra: tuple = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_bound(bound: float) -> str:
+    return "+Inf" if math.isinf(bound) else repr(float(bound))
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  RECORDING
+# ─────────────────────────────────────────────────────────────────────────────
+
+def observe(name: str, value: float, **labels) -> None:
+    """Add *value* to histogram *name*."""
+    key = _key(name, labels)
+    buckets = _METRICS[name][2]
+    with _lock:
+        hist = _values.get(key)
+        if hist is None:
+            hist = _values[key] = [0] * len(buckets) + [0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                hist[i] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+
+def count(name: str, amount: float = 1, **labels) -> None:
+    """Increment counter *name*."""
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + amount
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block into ``stage_seconds``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_seconds", time.perf_counter() - start, stage=name)
+
+
+def timed(name: str):
+    """Decorator timing each call (awaited, for coroutine functions) as stage *name*."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with stage(name):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot(reset: bool = False) -> list[tuple]:
+    """Picklable copy of every series; with *reset*, the registry is emptied."""
+    with _lock:
+        snap = [(key, list(v) if isinstance(v, list) else v) for key, v in _values.items()]
+        if reset:
+            _values.clear()
+    return snap
+
+
+def merge(snap: list[tuple]) -> None:
+    """Add a ``snapshot`` (e.g. from a worker process) into this registry."""
+    with _lock:
+        for key, value in snap:
+            if isinstance(value, list):
+                hist = _values.setdefault(key, [0] * (len(value) - 1) + [0])
+                for i, v in enumerate(value):
+                    hist[i] += v
+            else:
+                _values[key] = _values.get(key, 0) + value
+
+
+def render_metrics() -> str:
+    """Registry in the Prometheus text exposition format (version 0.0.4)."""
+    snap = sorted(snapshot(), key=lambda kv: kv[0])
+    lines = []
+    for name, (kind, help_text, buckets) in _METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for (series, labels), value in snap:
+            if series != name:
+                continue
+            if kind == "counter":
+                lines.append(f"{name}{_fmt_labels(labels)} {value}")
+                continue
+            for bound, n in zip(buckets, value):
+                lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', _fmt_bound(bound)),))} {n}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {value[-2]}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  REQUEST IDS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def get_request_id() -> str:
+    return _request_id.get()
+
+
+def set_request_id(request_id: str | None = None) -> str:
+    """Bind *request_id* (a new one if empty) to the current context and return it."""
+    request_id = request_id or uuid.uuid4().hex
+    _request_id.set(request_id)
+    return request_id
+
+
+_log_context_installed = False
+
+
+def install_log_context() -> None:
+    """Stamp every log record with the current request id and show it in the root handlers."""
+    global _log_context_installed
+    if _log_context_installed:
+        return
+    _log_context_installed = True
+
+    make_record = logging.getLogRecordFactory()
+
+    def record_factory(*args, **kwargs):
+        record = make_record(*args, **kwargs)
+        record.request_id = _request_id.get()
+        return record
+
+    logging.setLogRecordFactory(record_factory)
+    root = logging.getLogger()
+    if not root.handlers:
+        logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    for handler in root.handlers:
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
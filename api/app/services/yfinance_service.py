@@ -1,37 +1,22 @@
-import yfinance as yf
 import pandas as pd
 import logging
+import os
 import re
+import threading
+import time
 import warnings
+from contextlib import nullcontext
 from datetime import datetime
 from typing import Iterable, Dict
 
+from app.services.price_cache import get_price_cache
+from app.services.telemetry import count, stage
 
 
 def get_daily_performance(tickers):
     try:
-        data = yf.download(tickers, period="2d", group_by='ticker', auto_adjust=False)
-        performance = {}
-
-        for ticker in tickers:
-            try:
-                close_prices = data[ticker]["Close"]
-                if len(close_prices) < 2:
-                    performance[ticker] = None
-                    continue
-
-                prev_close = close_prices.iloc[-2]
-                last_close = close_prices.iloc[-1]
-                change = ((last_close - prev_close) / prev_close) * 100
-                performance[ticker] = round(change, 2)
-            except Exception:
-                performance[ticker] = None
-
-            # Check if the performance is not nan, if so, replace it with None
-            if performance[ticker] is not None and (performance[ticker] != performance[ticker]):
-                performance[ticker] = None
-
-        return performance
+        quotes = get_quotes(tickers)
+        return {ticker: quotes[ticker]["daily_performance"] for ticker in tickers}
 
     except Exception:
         return {ticker: None for ticker in tickers}
@@ -43,7 +28,10 @@ def get_stock_data(tickers, start_date=None, end_date=None):
             start_date = pd.to_datetime(start_date) - pd.Timedelta(days=1)
             start_date = start_date.strftime("%Y-%m-%d")
 
-        data = yf.download(tickers, start=start_date, end=end_date, group_by='ticker', auto_adjust=False)
+        if get_price_cache() is not None and start_date is not None:
+            return _cached_stock_data(tickers, start_date, end_date)
+
+        data = _yf_download(tickers, start=start_date, end=end_date, group_by='ticker', auto_adjust=False)
 
         if isinstance(tickers, str):
             # Single ticker
@@ -71,6 +59,27 @@ def get_stock_data(tickers, start_date=None, end_date=None):
         print(f"Error fetching stock data: {e}")
         return None
 
+def _cached_stock_data(tickers, start_date, end_date=None):
+    """get_stock_data served through the on-disk price cache (daily Close)."""
+    start = pd.to_datetime(start_date)
+    end = pd.to_datetime(end_date) if end_date else pd.Timestamp.today().normalize() + pd.Timedelta(days=1)
+
+    tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+    frames = _load_closes(tickers, start, end, "1d")
+    close_data = pd.DataFrame({
+        tk: frames[tk]["Close"] if frames[tk] is not None else pd.Series(dtype=float)
+        for tk in tickers
+    })
+    close_data.index.name = "Date"
+    data = close_data.sort_index().reset_index()
+
+    # convert to daily performance
+    for ticker in data.columns[1:]:
+        data[ticker] = data[ticker].pct_change()
+        data[ticker] = data[ticker].round(8)
+
+    return data.dropna()
+
 # ─────────────────────────────────────────────────────────────────────────────
 
 
@@ -79,6 +88,7 @@ __all__ = [
     "INTRADAY_LIMIT_DAYS",
     "RESAMPLE_RULE",
     "fetch_prices",
+    "get_quotes",
 ]
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -105,41 +115,118 @@ RESAMPLE_RULE: Dict[str, str] = {
     "1wk": "1W", "1mo": "1M", "3mo": "3M",
 }
 
+# Close columns kept from each download (and in the price cache).
+_CLOSE_COLUMNS = ("Close", "Adj Close")
+
+# Longest range (calendar days) for which an empty download is taken to mean
+# "market closed" rather than a failure when filling cache gaps.
+_EMPTY_GAP_DAYS: Dict[str, int] = {"5d": 10, "1wk": 14, "1mo": 62, "3mo": 185}
+
+# Default thread count for batched multi-ticker downloads.
+DOWNLOAD_THREADS = int(os.getenv("YF_DOWNLOAD_THREADS", "8"))
+
+# Seconds a cached quote is served as-is, and the age after which a stale
+# quote is no longer served while it refreshes.
+QUOTE_TTL = int(os.getenv("QUOTE_TTL", "60"))
+QUOTE_MAX_STALE = int(os.getenv("QUOTE_MAX_STALE", "900"))
+# Seconds a failed quote (no price) is remembered before it is downloaded again.
+QUOTE_FAILURE_TTL = int(os.getenv("QUOTE_FAILURE_TTL", "30"))
+
+_YF_LOCK = threading.Lock()
+
+# yfinance takes ~0.5 s to import, so it is loaded by the first download
+yf = None
+
 _logger = logging.getLogger(__name__)
 
 # ─────────────────────────────────────────────────────────────────────────────
 #  HELPER FUNCTIONS
 # ─────────────────────────────────────────────────────────────────────────────
 
-def _extract_close(df: pd.DataFrame) -> pd.Series | None:
-    """Extract the closing price series (Adjusted Close if available, otherwise Close)."""
-    if df.empty:
+def _extract_closes(df: pd.DataFrame) -> pd.DataFrame:
+    """Extract the Close and Adj Close columns (when present) of a single-ticker download."""
+    cols: dict[str, pd.Series] = {}
+    if not df.empty:
+        for col in _CLOSE_COLUMNS:
+            if isinstance(df.columns, pd.MultiIndex):
+                if col in df.columns.get_level_values(0):
+                    cols[col] = df.xs(col, level=0, axis=1).iloc[:, 0]
+            elif col in df.columns:
+                cols[col] = df[col]
+    return pd.DataFrame(cols).dropna(how="all")
+
+
+def _pick_close(closes: pd.DataFrame | None) -> pd.Series | None:
+    """Return the closing price series (Adjusted Close if available, otherwise Close)."""
+    if closes is None or closes.empty:
         return None
-    if isinstance(df.columns, pd.MultiIndex):
-        lvl0 = df.columns.get_level_values(0)
-        col = "Adj Close" if "Adj Close" in lvl0 else "Close"
-        return df.xs(col, level=0, axis=1).iloc[:, 0].dropna()
-    col = "Adj Close" if "Adj Close" in df.columns else "Close"
-    return df[col].dropna()
+    col = "Adj Close" if "Adj Close" in closes.columns else "Close"
+    return closes[col].dropna()
+
+
+def _yf_download(*args, **kwargs) -> pd.DataFrame:
+    """``yf.download`` serialized within the process.
+
+    yfinance keeps per-call state in module globals, so concurrent calls from
+    several threads (e.g. background quote refreshes) would mix results.
+    """
+    global yf
+    if yf is None:
+        import yfinance as yf
+    with _YF_LOCK, stage("yahoo_download"):
+        return yf.download(*args, **kwargs)
+
 
+def _yf_closes(ticker: str, interval: str, **window) -> pd.DataFrame:
+    """Single ``yf.download`` call reduced to its close columns."""
+    df = _yf_download(
+        ticker,
+        **window,
+        interval=interval,
+        progress=False,
+        auto_adjust=False,
+        timeout=30,
+    )
+    return _extract_closes(df)
 
-def _download_single(ticker: str, start: pd.Timestamp, end: pd.Timestamp, interval: str) -> pd.Series | None:
+
+def _yf_batch_closes(tickers: list[str], interval: str, threads: int, **window) -> dict[str, pd.DataFrame]:
+    """One multi-ticker ``yf.download`` call (threaded inside yfinance), split per ticker.
+
+    Tickers that failed come back as empty frames.
+    """
+    df = _yf_download(
+        tickers,
+        **window,
+        interval=interval,
+        group_by="ticker",
+        threads=threads,
+        progress=False,
+        auto_adjust=False,
+        timeout=30,
+    )
+    out: dict[str, pd.DataFrame] = {}
+    for tk in tickers:
+        try:
+            out[tk] = _extract_closes(df[tk])
+        except Exception:
+            out[tk] = _extract_closes(pd.DataFrame())
+    return out
+
+
+def _download_single(ticker: str, start: pd.Timestamp, end: pd.Timestamp, interval: str) -> pd.DataFrame | None:
     """Download a single ticker with one retry attempt and a period fallback."""
     tried_retry = False
     while True:
         try:
-            df = yf.download(
+            closes = _yf_closes(
                 ticker,
+                interval,
                 start=start.strftime("%Y-%m-%d"),
                 end=end.strftime("%Y-%m-%d"),
-                interval=interval,
-                progress=False,
-                auto_adjust=False,
-                timeout=30,
             )
-            ser = _extract_close(df)
-            if ser is not None and not ser.empty:
-                return ser
+            if not closes.empty:
+                return closes
             raise ValueError("empty dataframe")
         except Exception as exc:
             msg = str(exc)
@@ -148,6 +235,7 @@ def _download_single(ticker: str, start: pd.Timestamp, end: pd.Timestamp, interv
                 limit = int(match.group(1))
                 start = end - pd.Timedelta(days=limit - 1)
                 _logger.info("%s: Yahoo limit %s d – retrying with start=%s", ticker, limit, start.date())
+                count("yahoo_download_events_total", event="retry")
                 tried_retry = True
                 continue
             warnings.warn(f"{ticker}: download failed – {msg}")
@@ -157,19 +245,147 @@ def _download_single(ticker: str, start: pd.Timestamp, end: pd.Timestamp, interv
     limit = INTRADAY_LIMIT_DAYS.get(interval, 30)
     try:
         _logger.info("%s: fallback using period=%sd", ticker, limit)
-        df = yf.download(
-            ticker,
-            period=f"{limit}d",
-            interval=interval,
-            progress=False,
-            auto_adjust=False,
-            timeout=30,
-        )
-        return _extract_close(df)
+        count("yahoo_download_events_total", event="period_fallback")
+        return _yf_closes(ticker, interval, period=f"{limit}d")
     except Exception as exc:
         warnings.warn(f"{ticker}: fallback failed – {exc}")
+        count("yahoo_download_events_total", event="failed")
         return None
 
+
+def _load_closes(
+    tickers: list[str],
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    interval: str,
+    max_workers: int | None = None,
+) -> dict[str, pd.DataFrame | None]:
+    """Close columns for ``[start, end)`` per ticker, using as few Yahoo round trips as possible.
+
+    - Windows already in the price cache are served from disk.
+    - Tickers missing the same ranges are fetched together in one batched
+      download, using at most *max_workers* threads.
+    - An empty answer for a short range (weekend, holiday) of an already
+      cached ticker counts as covered.
+    - Anything else that comes back empty goes through ``_download_single``
+      (retry + period fallback), one ticker at a time.
+    - Tickers to download are locked in the price cache (across processes)
+      and re-checked once locked, so concurrent fetches of the same ticker
+      and window, from any worker and in any ticker order, download it once.
+    """
+    cache = get_price_cache()
+    threads = max_workers or DOWNLOAD_THREADS
+
+    out: dict[str, pd.DataFrame | None] = {}
+    pending: list[str] = []
+    for tk in tickers:
+        if cache is not None:
+            cached, coverage = cache.load(tk, interval)
+            gaps = cache.missing(coverage, start, end)
+            result = "miss" if coverage is None else "partial" if gaps else "hit"
+            count("cache_lookups_total", cache="prices", result=result)
+            if not gaps:
+                _logger.info("%s: cache hit %s %s → %s", tk, interval, start.date(), end.date())
+                out[tk] = cache.window(cached, start, end)
+                continue
+        pending.append(tk)
+
+    fallback: list[str] = []
+    with cache.lock_many(pending, interval) if cache is not None else nullcontext():
+        _fill_closes(out, fallback, pending, start, end, interval, threads, cache)
+
+    # yf.download keeps per-call state in module globals, so retries stay serial.
+    for tk in fallback:
+        count("yahoo_download_events_total", event="single_fallback")
+        out[tk] = _download_single(tk, start, end, interval)
+
+    return {tk: out.get(tk) for tk in tickers}
+
+
+def _fill_closes(
+    out: dict,
+    fallback: list[str],
+    tickers: list[str],
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    interval: str,
+    threads: int,
+    cache,
+) -> None:
+    """Download the missing ranges of *tickers* into *out* (and the cache); tickers
+    that need the single-ticker path are appended to *fallback*. With a cache, the
+    caller holds the tickers' locks."""
+    max_empty = pd.Timedelta(days=_EMPTY_GAP_DAYS.get(interval, 5))
+    groups: dict[tuple, list[str]] = {}
+    cold: set[str] = set()
+    for tk in tickers:
+        gaps = [(start, end)]
+        if cache is not None:
+            # Re-read under the lock: another worker may have filled it meanwhile
+            cached, coverage = cache.load(tk, interval)
+            gaps = cache.missing(coverage, start, end)
+            if not gaps:
+                count("coalesced_calls_total", call="price_download")
+                out[tk] = cache.window(cached, start, end)
+                continue
+            if coverage is None:
+                cold.add(tk)
+        groups.setdefault(tuple(gaps), []).append(tk)
+
+    for gaps, group in groups.items():
+        fills: dict[str, list] = {tk: [] for tk in group}
+        for a, b in gaps:
+            _logger.info("%s: downloading %s %s → %s", ", ".join(group), interval, a.date(), b.date())
+            try:
+                batch = _yf_batch_closes(
+                    group, interval, threads, start=a.strftime("%Y-%m-%d"), end=b.strftime("%Y-%m-%d"))
+            except Exception as exc:
+                _logger.info("batched download failed (%s) – falling back per ticker", exc)
+                count("yahoo_download_events_total", event="batch_failed")
+                batch = {}
+            for tk in group:
+                part = batch.get(tk)
+                if part is None or (part.empty and (tk in cold or b - a > max_empty)):
+                    fills[tk] = None
+                elif fills[tk] is not None:
+                    fills[tk].append((a, b, part))
+
+        for tk in group:
+            if fills[tk] is None:
+                fallback.append(tk)
+            elif cache is not None:
+                merged = cache.update(tk, interval, fills[tk])
+                out[tk] = cache.window(merged, start, end) if merged is not None else None
+            else:
+                out[tk] = fills[tk][0][2]
+
+
+def _aligned_prices(
+    tickers: list[str],
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    interval: str,
+    max_workers: int | None,
+) -> pd.DataFrame:
+    """Body of ``fetch_prices`` once the window is settled."""
+    closes = _load_closes(tickers, start, end, interval, max_workers)
+
+    data: dict[str, pd.Series] = {}
+    for tk in tickers:
+        ser = _pick_close(closes[tk])
+        if ser is None or ser.empty:
+            warnings.warn(f"{tk}: no data retrieved – skipped")
+            continue
+        data[tk] = ser
+
+    if not data:
+        raise ValueError("No usable price data fetched.")
+
+    df = pd.DataFrame(data).dropna(how="all")
+    if df.empty:
+        raise ValueError("Price DataFrame is empty after alignment.")
+    return df
+
 # ─────────────────────────────────────────────────────────────────────────────
 #  PUBLIC API
 # ─────────────────────────────────────────────────────────────────────────────
@@ -179,11 +395,16 @@ def fetch_prices(
     start_date: str | pd.Timestamp,
     end_date: str | pd.Timestamp | None = None,
     interval: str = "1d",
+    max_workers: int | None = None,
 ) -> pd.DataFrame:
     """Download and align close price series for given tickers and interval.
 
     - If the intraday interval exceeds the Yahoo limit, start_date is trimmed.
+    - Tickers are downloaded together, with at most *max_workers* threads
+      (default ``YF_DOWNLOAD_THREADS``).
     - Tickers that fail to download are skipped with warnings.
+    - Concurrent calls (in any process) needing the same ticker and window
+      share one download through the price cache locks.
     - Raises ValueError if no usable data is retrieved.
     """
     start = pd.to_datetime(start_date)
@@ -196,19 +417,103 @@ def fetch_prices(
             f"Interval '{interval}' is limited to {max_hist} days – start_date was adjusted automatically.")
         start = end - pd.Timedelta(days=max_hist - 1)
 
-    data: dict[str, pd.Series] = {}
+    tickers = list(dict.fromkeys(tickers))
+    return _aligned_prices(tickers, start, end, interval, max_workers)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  QUOTE CACHE
+# ─────────────────────────────────────────────────────────────────────────────
+# ticker -> (quote, fetched_at), shared by every request of the process
+_quotes: dict[str, tuple[dict, float]] = {}
+_quotes_lock = threading.Lock()
+_quotes_refreshing: set[str] = set()
+
+
+def _download_quotes(tickers: list[str]) -> dict[str, dict]:
+    """Last price and daily change (%) for *tickers* from a single download."""
+    data = _yf_download(tickers, period="5d", group_by="ticker", auto_adjust=False, progress=False)
+    quotes = {}
     for tk in tickers:
-        _logger.info("%s: downloading %s %s → %s", tk, interval, start.date(), end.date())
-        ser = _download_single(tk, start, end, interval)
-        if ser is None or ser.empty:
-            warnings.warn(f"{tk}: no data retrieved – skipped")
-            continue
-        data[tk] = ser
+        try:
+            close = data[tk]["Close"].dropna()
+        except Exception:
+            close = pd.Series(dtype=float)
+        price = round(float(close.iloc[-1]), 2) if len(close) else None
+        change = None
+        if len(close) >= 2:
+            change = round(float((close.iloc[-1] - close.iloc[-2]) / close.iloc[-2] * 100), 2)
+        quotes[tk] = {"price": price, "daily_performance": change}
+    return quotes
 
-    if not data:
-        raise ValueError("No usable price data fetched.")
 
-    df = pd.DataFrame(data).dropna(how="all")
-    if df.empty:
-        raise ValueError("Price DataFrame is empty after alignment.")
-    return df
+def _store_quotes(quotes: dict[str, dict]) -> None:
+    """Cache *quotes*; a failed one (no price) never replaces a quote that can still be served."""
+    now = time.time()
+    with _quotes_lock:
+        for tk, quote in quotes.items():
+            old = _quotes.get(tk)
+            if quote["price"] is None and old is not None and old[0]["price"] is not None \
+                    and now - old[1] <= QUOTE_MAX_STALE:
+                continue
+            _quotes[tk] = (quote, now)
+
+
+def _refresh_quotes_in_background(tickers: list[str]) -> None:
+    """Refresh stale quotes in one background download (one refresh per ticker at a time)."""
+    with _quotes_lock:
+        tickers = [tk for tk in tickers if tk not in _quotes_refreshing]
+        _quotes_refreshing.update(tickers)
+    if not tickers:
+        return
+
+    def run():
+        try:
+            _store_quotes(_download_quotes(tickers))
+        except Exception as exc:
+            _logger.warning("Quote refresh failed for %s: %s", tickers, exc)
+        finally:
+            with _quotes_lock:
+                _quotes_refreshing.difference_update(tickers)
+
+    threading.Thread(target=run, name="quote-refresh", daemon=True).start()
+
+
+def get_quotes(tickers: Iterable[str]) -> dict[str, dict]:
+    """Return ``{ticker: {'price': float|None, 'daily_performance': float|None}}``.
+
+    - Quotes younger than QUOTE_TTL are served from memory.
+    - Older ones (up to QUOTE_MAX_STALE) are served as-is while a background
+      download refreshes them.
+    - Failed quotes are served as failed for QUOTE_FAILURE_TTL.
+    - Unknown or too old quotes are downloaded now, all in one call.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    now = time.time()
+    out: dict[str, dict] = {}
+    missing, stale = [], []
+    with _quotes_lock:
+        for tk in tickers:
+            entry = _quotes.get(tk)
+            failed = entry is not None and entry[0]["price"] is None
+            if entry is None or now - entry[1] > (QUOTE_FAILURE_TTL if failed else QUOTE_MAX_STALE):
+                missing.append(tk)
+                continue
+            out[tk] = entry[0]
+            if now - entry[1] > QUOTE_TTL:
+                stale.append(tk)
+    count("cache_lookups_total", len(tickers) - len(missing) - len(stale), cache="quotes", result="hit")
+    count("cache_lookups_total", len(stale), cache="quotes", result="stale")
+    count("cache_lookups_total", len(missing), cache="quotes", result="miss")
+
+    if missing:
+        try:
+            fetched = _download_quotes(missing)
+        except Exception as exc:
+            _logger.warning("Quote download failed for %s: %s", missing, exc)
+            fetched = {tk: {"price": None, "daily_performance": None} for tk in missing}
+        _store_quotes(fetched)
+        out.update(fetched)
+    if stale:
+        _refresh_quotes_in_background(stale)
+
+    return {tk: out[tk] for tk in tickers}
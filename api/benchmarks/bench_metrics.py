@@ -0,0 +1,188 @@
+"""bench_metrics.py – Offline micro-benchmarks
+===========================================
+Times the numerical pipeline on synthetic data, and ``fetch_prices`` against
+an in-process stand-in for yfinance, so no network access is needed.
+
+Run from the ``api`` directory:
+
+    python -m benchmarks.bench_metrics --out bench.json
+    python -m benchmarks.bench_metrics --assets 5 50 --lengths daily --repeat 3
+
+Results are written as JSON: environment versions plus one record per
+(benchmark, asset count, length) with min/median wall time in seconds.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import scipy
+
+from app.optimizitation.metrics import (
+    COV_METHODS,
+    Moments,
+    calculate_returns,
+    compute_portfolio_series,
+    optimise_weights,
+    random_portfolios,
+    sharpe_ratio,
+    sortino_ratio,
+    total_return,
+)
+from app.services import yfinance_service
+from app.services.price_cache import PriceCache
+
+# ─────────────────────────────────────────────────────────────────────
+#  GRID
+# ─────────────────────────────────────────────────────────────────────
+ASSET_COUNTS = [5, 20, 100, 500]
+
+# Number of return periods: 5 years of daily bars, 60 days of 5-minute bars.
+LENGTHS = {"daily": 5 * 252, "intraday": 60 * 78}
+
+METRICS = ["sharpe", "sortino", "total return", "weekly return", "daily return"]
+
+# ─────────────────────────────────────────────────────────────────────
+#  SYNTHETIC DATA
+# ─────────────────────────────────────────────────────────────────────
+
+def _synthetic_prices(n_assets: int, n_periods: int, seed: int = 0) -> pd.DataFrame:
+    """One-factor random-walk prices, daily index."""
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0.0003, 0.01, (n_periods + 1, 1))
+    rets = market * rng.uniform(0.5, 1.5, n_assets) + rng.normal(0.0002, 0.015, (n_periods + 1, n_assets))
+    index = pd.date_range("2000-01-03", periods=n_periods + 1, freq="D")
+    return pd.DataFrame(100 * np.cumprod(1 + rets, axis=0), index=index,
+                        columns=[f"T{i:03d}" for i in range(n_assets)])
+
+
+class FakeYFinance:
+    """Stand-in for the ``yfinance`` module: ``download`` builds synthetic bars."""
+
+    def download(self, tickers, start=None, end=None, period=None, group_by="column", **_):
+        if period is not None:
+            end = pd.Timestamp.today().normalize()
+            start = end - pd.Timedelta(days=int(period.rstrip("d")))
+        index = pd.bdate_range(start, pd.Timestamp(end) - pd.Timedelta(days=1), name="Date")
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        rng = np.random.default_rng(len(index))
+        frames = {}
+        for tk in tickers:
+            close = 100 * np.cumprod(1 + rng.normal(0.0003, 0.01, len(index)))
+            frames[tk] = pd.DataFrame({"Adj Close": close, "Close": close}, index=index)
+        df = pd.concat(frames, axis=1, names=["Ticker", "Price"])
+        return df if group_by == "ticker" else df.swaplevel(0, 1, axis=1)
+
+# ─────────────────────────────────────────────────────────────────────
+#  TIMING
+# ─────────────────────────────────────────────────────────────────────
+
+def _time(fn, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {"repeat": repeat, "min_s": min(times), "median_s": statistics.median(times)}
+
+
+def _bench_numerics(n_assets: int, length: str, repeat: int, max_opt_assets: int) -> list[dict]:
+    n_periods = LENGTHS[length]
+    prices = _synthetic_prices(n_assets, n_periods)
+    returns = calculate_returns(prices, "1d")
+    weights = np.full(n_assets, 1 / n_assets)
+    case = {"n_assets": n_assets, "length": length, "n_periods": n_periods}
+
+    results = [
+        case | {"benchmark": "calculate_returns"} | _time(lambda: calculate_returns(prices, "1d"), repeat),
+        case | {"benchmark": "sharpe_ratio"} | _time(lambda: sharpe_ratio(weights, returns), repeat),
+        case | {"benchmark": "sortino_ratio"} | _time(lambda: sortino_ratio(weights, returns), repeat),
+        case | {"benchmark": "total_return"} | _time(lambda: total_return(weights, returns), repeat),
+        case | {"benchmark": "compute_portfolio_series"} | _time(lambda: compute_portfolio_series(returns, weights), repeat),
+        case | {"benchmark": "random_portfolios", "n_portfolios": 100_000}
+        | _time(lambda: random_portfolios(returns, 100_000, seed=0), repeat),
+    ]
+    for method in COV_METHODS:
+        results.append(case | {"benchmark": "covariance", "cov_method": method}
+                       | _time(lambda: Moments(returns, method).cov, repeat))
+    if n_assets <= max_opt_assets:
+        for metric in METRICS:
+            results.append(case | {"benchmark": "optimise_weights", "metric": metric}
+                           | _time(lambda: optimise_weights(returns, metric), repeat))
+    return results
+
+
+def _bench_fetch(n_assets: int, repeat: int) -> list[dict]:
+    """fetch_prices on the fake yfinance, without and with a warm price cache."""
+    tickers = [f"T{i:03d}" for i in range(n_assets)]
+    case = {"n_assets": n_assets, "length": "daily", "n_periods": LENGTHS["daily"]}
+    fetch = lambda: yfinance_service.fetch_prices(tickers, "2015-01-01", "2020-01-01")
+
+    real_yf, real_cache = yfinance_service.yf, yfinance_service.get_price_cache
+    yfinance_service.yf = FakeYFinance()
+    try:
+        yfinance_service.get_price_cache = lambda: None
+        results = [case | {"benchmark": "fetch_prices", "cache": "off"} | _time(fetch, repeat)]
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = PriceCache(tmp)
+            yfinance_service.get_price_cache = lambda: cache
+            fetch()  # warm the cache
+            results.append(case | {"benchmark": "fetch_prices", "cache": "warm"} | _time(fetch, repeat))
+    finally:
+        yfinance_service.yf, yfinance_service.get_price_cache = real_yf, real_cache
+    return results
+
+# ─────────────────────────────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────────────────────────────
+
+def _build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Offline benchmarks for metrics and optimisation")
+    p.add_argument("--assets", nargs="+", type=int, default=ASSET_COUNTS, help="Asset counts")
+    p.add_argument("--lengths", nargs="+", choices=list(LENGTHS), default=list(LENGTHS), help="Series lengths")
+    p.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+    p.add_argument("--max-opt-assets", type=int, default=500, help="Skip optimise_weights above this many assets")
+    p.add_argument("--skip-fetch", action="store_true", help="Do not benchmark fetch_prices")
+    p.add_argument("--out", help="Write JSON here instead of stdout")
+    return p
+
+
+def main():
+    args = _build_parser().parse_args()
+    warnings.simplefilter("ignore")
+
+    results = []
+    for n_assets in args.assets:
+        for length in args.lengths:
+            print(f"[bench] {n_assets} assets, {length}", file=sys.stderr)
+            results.extend(_bench_numerics(n_assets, length, args.repeat, args.max_opt_assets))
+        if not args.skip_fetch:
+            results.extend(_bench_fetch(n_assets, args.repeat))
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "scipy": scipy.__version__,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
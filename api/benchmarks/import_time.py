@@ -0,0 +1,104 @@
+"""import_time.py – Cold-start import report
+=========================================
+Imports a module in a fresh interpreter with ``python -X importtime`` and
+reports the total import time, its slowest direct imports, and whether
+the modules that are meant to load on demand (SDKs, scipy, yfinance,
+plotly) were pulled in anyway.
+
+Run from the ``api`` directory:
+
+    python -m benchmarks.import_time                     # app.main
+    python -m benchmarks.import_time --module app.optimizitation.optimize --json
+"""
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+# Modules that should only be imported on first use
+DEFERRED = [
+    "firebase_admin",
+    "google.cloud.firestore",
+    "pyrebase",
+    "scipy.optimize",
+    "yfinance",
+    "plotly",
+]
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# ─────────────────────────────────────────────────────────────────────
+#  MEASUREMENT
+# ─────────────────────────────────────────────────────────────────────
+
+def measure(module: str) -> dict:
+    """Import *module* in a subprocess and summarise ``-X importtime`` output.
+
+    Returns
+    -------
+    dict
+        'module', 'total_ms', 'top' (slowest direct imports of the module,
+        as {'module', 'cumulative_ms'}) and 'deferred' ({name: imported?}).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).resolve().parents[1],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            _, cumulative, indent, name = match.groups()
+            entries.append((name, len(indent), int(cumulative)))
+
+    # Output is post-order: a module's imports are printed just before it,
+    # indented two more spaces per level.
+    end = max(i for i, (name, _, _) in enumerate(entries) if name == module)
+    root_depth, total = entries[end][1], entries[end][2]
+    start = end
+    while start > 0 and entries[start - 1][1] > root_depth:
+        start -= 1
+    children = [(name, cum) for name, depth, cum in entries[start:end] if depth == root_depth + 2]
+    top = sorted(children, key=lambda e: -e[1])
+    loaded = {name for name, _, _ in entries}
+    return {
+        "module": module,
+        "total_ms": round(total / 1000, 1),
+        "top": [{"module": name, "cumulative_ms": round(cum / 1000, 1)} for name, cum in top[:15]],
+        "deferred": {name: name in loaded for name in DEFERRED},
+    }
+
+# ─────────────────────────────────────────────────────────────────────
+#  CLI
+# ─────────────────────────────────────────────────────────────────────
+
+def main():
+    p = argparse.ArgumentParser(description="Import-time report")
+    p.add_argument("--module", default="app.main", help="Module to import")
+    p.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = p.parse_args()
+
+    report = measure(args.module)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"import {report['module']}: {report['total_ms']:.0f} ms")
+    print("\nSlowest imports:")
+    for entry in report["top"]:
+        print(f"  {entry['cumulative_ms']:8.1f} ms  {entry['module']}")
+    print("\nDeferred modules (should not be imported):")
+    for name, imported in report["deferred"].items():
+        print(f"  {'IMPORTED' if imported else 'deferred':8s}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Local ID-token verification against a stand-in key set (no network)."""
+
+import asyncio
+import datetime
+import time
+
+import jwt
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from app.core import firebase_tokens
+from app.core.firebase_tokens import SigningKeys, TokenVerifier
+
+PROJECT_ID = "demo-project"
+
+
+def _key_and_cert():
+	key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+	name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.test")])
+	now = datetime.datetime.now(datetime.timezone.utc)
+	cert = (
+		x509.CertificateBuilder()
+		.subject_name(name)
+		.issuer_name(name)
+		.public_key(key.public_key())
+		.serial_number(x509.random_serial_number())
+		.not_valid_before(now - datetime.timedelta(days=1))
+		.not_valid_after(now + datetime.timedelta(days=1))
+		.sign(key, hashes.SHA256())
+	)
+	return key, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+class StandInKeys:
+	"""Loader serving a mutable {kid: PEM} set and counting fetches."""
+
+	def __init__(self, certs: dict, max_age: int = 3600):
+		self.certs = dict(certs)
+		self.max_age = max_age
+		self.calls = 0
+		self.fail = False
+
+	def __call__(self):
+		self.calls += 1
+		if self.fail:
+			raise ConnectionError("cert endpoint unavailable")
+		return dict(self.certs), self.max_age
+
+
+@pytest.fixture(scope="module")
+def key_a():
+	return _key_and_cert()
+
+
+@pytest.fixture(scope="module")
+def key_b():
+	return _key_and_cert()
+
+
+def _token(private_key, kid: str, **overrides) -> str:
+	now = int(time.time())
+	claims = {
+		"iss": f"https://securetoken.google.com/{PROJECT_ID}",
+		"aud": PROJECT_ID,
+		"sub": "user-1",
+		"email": "user@example.com",
+		"iat": now,
+		"exp": now + 3600,
+	} | overrides
+	return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+def _verifier(loader) -> TokenVerifier:
+	return TokenVerifier(PROJECT_ID, keys=SigningKeys(loader))
+
+
+def test_valid_token(key_a):
+	loader = StandInKeys({"a": key_a[1]})
+	claims = asyncio.run(_verifier(loader).verify_async(_token(key_a[0], "a")))
+	assert claims["sub"] == "user-1"
+	assert loader.calls == 1
+
+
+def test_expired_token(key_a):
+	verifier = _verifier(StandInKeys({"a": key_a[1]}))
+	token = _token(key_a[0], "a", iat=int(time.time()) - 7200, exp=int(time.time()) - 3600)
+	with pytest.raises(jwt.ExpiredSignatureError):
+		verifier.verify(token)
+
+
+@pytest.mark.parametrize("overrides", [{"aud": "other-project"}, {"iss": "https://securetoken.google.com/other-project"}])
+def test_wrong_audience_or_issuer(key_a, overrides):
+	verifier = _verifier(StandInKeys({"a": key_a[1]}))
+	with pytest.raises(jwt.InvalidTokenError):
+		verifier.verify(_token(key_a[0], "a", **overrides))
+
+
+def test_unknown_kid_triggers_one_refresh(key_a, key_b, monkeypatch):
+	monkeypatch.setattr(firebase_tokens, "MIN_RELOAD_INTERVAL", 0)
+	loader = StandInKeys({"a": key_a[1]})
+	verifier = _verifier(loader)
+	verifier.verify(_token(key_a[0], "a"))
+
+	# Keys rotate: "b" is only known after one reload
+	loader.certs["b"] = key_b[1]
+	assert verifier.verify(_token(key_b[0], "b"))["sub"] == "user-1"
+	assert loader.calls == 2
+
+
+def test_claims_cache_hit(key_a):
+	loader = StandInKeys({"a": key_a[1]})
+	verifier = _verifier(loader)
+	token = _token(key_a[0], "a")
+	first = verifier.verify(token)
+
+	class NoKeys:
+		def get(self, kid):
+			raise AssertionError("cached claims should not need a key")
+
+	verifier.keys = NoKeys()
+	assert verifier.verify(token) is first
+
+
+def test_expired_keys_are_served_while_refresh_fails(key_a):
+	loader = StandInKeys({"a": key_a[1]}, max_age=0)
+	verifier = _verifier(loader)
+	verifier.verify(_token(key_a[0], "a", sub="user-1"))
+
+	# The key set is past its max-age and the endpoint is down: requests are
+	# still verified with the last good keys, without waiting for a fetch
+	loader.fail = True
+	claims = asyncio.run(verifier.verify_async(_token(key_a[0], "a", sub="user-2")))
+	assert claims["sub"] == "user-2"
+
+
+def test_failed_fetch_is_not_retried_per_request(key_a):
+	loader = StandInKeys({"a": key_a[1]})
+	loader.fail = True
+	verifier = _verifier(loader)
+	token = _token(key_a[0], "a")
+	with pytest.raises(ConnectionError):
+		asyncio.run(verifier.verify_async(token))
+	with pytest.raises(jwt.InvalidTokenError):
+		asyncio.run(verifier.verify_async(token))
+	assert loader.calls == 1
@@ -0,0 +1,66 @@
+"""Result cache lifetimes, with a stand-in Yahoo Finance download (no network)."""
+
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.optimizitation.optimize import canonical_request, optimize_portfolio
+from app.services import yfinance_service
+from app.services.result_cache import ResultCache
+
+FAILING = "FAIL"
+
+
+def _download(tickers, start=None, end=None, period=None, group_by="column", **kwargs):
+    """Random-walk closes for every ticker except FAILING, which comes back empty."""
+    single = isinstance(tickers, str)
+    tickers = [tickers] if single else tickers
+    index = pd.bdate_range(start or "2020-01-01", pd.Timestamp(end or "2021-01-01") - pd.Timedelta(days=1), name="Date")
+    rng = np.random.default_rng(len(tickers))
+    frames = {}
+    for tk in tickers:
+        if tk == FAILING:
+            continue
+        close = 100 * np.cumprod(1 + rng.normal(0.0005, 0.01, len(index)))
+        frames[tk] = pd.DataFrame({"Adj Close": close, "Close": close}, index=index)
+    if not frames:
+        return pd.DataFrame()
+    if single:
+        return frames[tickers[0]]
+    return pd.concat(frames, axis=1, names=["Ticker", "Price"])
+
+
+@pytest.fixture
+def stand_in_yahoo(monkeypatch):
+    monkeypatch.setattr(yfinance_service, "get_price_cache", lambda: None)
+    monkeypatch.setattr(yfinance_service, "_yf_download", _download)
+
+
+def _optimize(tickers):
+    request = canonical_request(tickers=tickers, start_date="2020-01-01", end_date="2021-01-01")
+    return request, optimize_portfolio(**request)
+
+
+def test_complete_historical_result_is_kept_and_persisted(stand_in_yahoo, tmp_path):
+    cache = ResultCache(max_bytes=1 << 20, ttl=0.01, directory=tmp_path)
+    request, result = _optimize(["AAA", "BBB"])
+    cache.put(request, result)
+
+    time.sleep(0.02)
+    assert cache.get(request) == result
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_result_missing_a_failed_ticker_expires(stand_in_yahoo, tmp_path):
+    cache = ResultCache(max_bytes=1 << 20, ttl=0.01, directory=tmp_path)
+    with pytest.warns(UserWarning, match=FAILING):
+        request, result = _optimize(["AAA", "BBB", FAILING])
+    assert FAILING not in result["weights"]
+    cache.put(request, result)
+
+    assert cache.get(request) == result
+    assert list(tmp_path.iterdir()) == []
+    time.sleep(0.02)
+    assert cache.get(request) is None